@@ -12,6 +12,7 @@ from resolwe.flow.execution_engines.base import BaseExecutionEngine
 from resolwe.flow.execution_engines.exceptions import ExecutionError
 from resolwe.flow.expression_engines import EvaluationError
 from resolwe.flow.models.utils import hydrate_input_references, hydrate_input_uploads
+from resolwe.flow.utils.schema import get_compiled_schema
 
 
 class SafeString(six.text_type):
@@ -29,8 +30,9 @@ class ExecutionEngine(BaseExecutionEngine):
         """Evaluate the code needed to compute a given Data object."""
         try:
             inputs = copy.deepcopy(data.input)
-            hydrate_input_references(inputs, data.process.input_schema)
-            hydrate_input_uploads(inputs, data.process.input_schema)
+            input_schema = get_compiled_schema(data.process, 'input_schema')
+            hydrate_input_references(inputs, input_schema)
+            hydrate_input_uploads(inputs, input_schema)
 
             # Include special 'proc' variable in the context.
             inputs['proc'] = {
@@ -11,6 +11,7 @@ from resolwe.flow.execution_engines.base import BaseExecutionEngine
 from resolwe.flow.execution_engines.exceptions import ExecutionError
 from resolwe.flow.expression_engines import EvaluationError
 from resolwe.flow.models import Data, DataDependency, Process
+from resolwe.flow.utils.latest import get_latest_version
 from resolwe.permissions.utils import copy_permissions
 
 
@@ -84,8 +85,9 @@ class ExecutionEngine(BaseExecutionEngine):
                 ))
 
             # Fetch target process.
-            process = Process.objects.filter(slug=step_slug).order_by('-version').first()
-            if not process:
+            try:
+                process = get_latest_version(Process, step_slug)
+            except Process.DoesNotExist:
                 raise ExecutionError('Incorrect definition of step "{}", invalid process "{}".'.format(
                     step_id, step_slug
                 ))
@@ -14,6 +14,7 @@ import json
 import logging
 import os
 import shutil
+import threading
 import traceback
 import uuid
 from collections import defaultdict
@@ -23,15 +24,17 @@ import six
 from django.apps import apps
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import transaction
+from django.db import connection, router, transaction
 from django.db.models import Count
+from django.db.models.signals import post_save
 from django.urls import reverse
 
 from resolwe.flow.engine import BaseEngine
 from resolwe.flow.models import Data, DataDependency, Entity, Process
 from resolwe.flow.utils import dict_dot, iterate_fields
-from resolwe.flow.utils.purge import data_purge
-from resolwe.permissions.utils import copy_permissions
+from resolwe.flow.utils.latest import get_latest_version
+from resolwe.flow.utils.stdout import DEFAULT_TAIL_SIZE, StdoutWriter
+from resolwe.permissions.utils import bulk_copy_permissions
 from resolwe.utils import BraceMessage as __
 
 if settings.USE_TZ:
@@ -58,6 +61,23 @@ def iterjson(text):
         yield obj
 
 
+def heartbeat(data_id, interval, stop_event):
+    """Periodically update the heartbeat of a running data object.
+
+    The heartbeat is updated every ``interval`` seconds until
+    ``stop_event`` is set.
+
+    """
+    try:
+        while not stop_event.wait(interval):
+            Data.objects.filter(pk=data_id).update(process_heartbeat=now())
+    except Exception:  # pylint: disable=broad-except
+        logger.error(__("Heartbeat error:\n\n{}", traceback.format_exc()))
+    finally:
+        # Each thread opens its own database connection.
+        connection.close()
+
+
 class BaseFlowExecutor(BaseEngine):
     """Represents a workflow executor."""
 
@@ -190,7 +210,13 @@ class BaseFlowExecutor(BaseEngine):
         os.chmod(output_path, dir_mode)
         os.chdir(output_path)
 
-        log_file = open('stdout.txt', 'w+')
+        executor_settings = getattr(settings, 'FLOW_EXECUTOR', {})
+        log_file = StdoutWriter(
+            output_path,
+            compress=executor_settings.get('STDOUT_COMPRESS', False),
+            max_size=executor_settings.get('STDOUT_MAX_SIZE', None),
+            tail_size=executor_settings.get('STDOUT_TAIL_SIZE', DEFAULT_TAIL_SIZE),
+        )
         json_file = open('jsonout.txt', 'w+')
 
         proc_pid = self.start()
@@ -198,9 +224,16 @@ class BaseFlowExecutor(BaseEngine):
         self.update_data_status(
             status=Data.STATUS_PROCESSING,
             started=now(),
+            process_heartbeat=now(),
             process_pid=proc_pid
         )
 
+        heartbeat_interval = getattr(settings, 'FLOW_EXECUTOR', {}).get('HEARTBEAT_INTERVAL', 30)
+        heartbeat_stop = threading.Event()
+        heartbeat_thread = threading.Thread(target=heartbeat, args=(data_id, heartbeat_interval, heartbeat_stop))
+        heartbeat_thread.daemon = True
+        heartbeat_thread.start()
+
         # Run processor and handle intermediate results
         self.run_script(script)
         spawn_processors = []
@@ -220,7 +253,6 @@ class BaseFlowExecutor(BaseEngine):
                     if line.strip().startswith('run'):
                         # Save processor and spawn if no errors
                         log_file.write(line)
-                        log_file.flush()
 
                         for obj in iterjson(line[3:].strip()):
                             spawn_processors.append(obj)
@@ -278,12 +310,10 @@ class BaseFlowExecutor(BaseEngine):
                         # Debug output
                         # Not referenced in Data object
                         json_file.write(line)
-                        json_file.flush()
 
                 except ValueError as ex:
                     # Ignore if not JSON
                     log_file.write(line)
-                    log_file.flush()
 
         except MemoryError as ex:
             logger.error(__("Out of memory: {}", ex))
@@ -292,6 +322,8 @@ class BaseFlowExecutor(BaseEngine):
             # TODO: if ex.errno == 28: no more free space
             raise ex
         finally:
+            heartbeat_stop.set()
+
             # Store results
             log_file.close()
             json_file.close()
@@ -310,9 +342,13 @@ class BaseFlowExecutor(BaseEngine):
                 parent_data = Data.objects.get(pk=self.data_id)
 
                 # Spawn processors
+                processes = {}
+                spawned_data = []
                 for d in spawn_processors:
                     d['contributor'] = parent_data.contributor
-                    d['process'] = Process.objects.filter(slug=d['process']).latest()
+                    if d['process'] not in processes:
+                        processes[d['process']] = get_latest_version(Process, d['process'])
+                    d['process'] = processes[d['process']]
 
                     for field_schema, fields in iterate_fields(d.get('input', {}), d['process'].input_schema):
                         type_ = field_schema['type']
@@ -324,28 +360,37 @@ class BaseFlowExecutor(BaseEngine):
                         elif type_ == 'list:basic:file:':
                             fields[name] = [self.hydrate_spawned_files(fn, data_id) for fn in value]
 
-                    with transaction.atomic():
-                        d = Data.objects.create(**d)
-                        DataDependency.objects.create(
-                            parent=parent_data,
-                            child=d,
-                            kind=DataDependency.KIND_SUBPROCESS,
-                        )
+                    spawned_data.append(Data(**d))
+
+                with transaction.atomic():
+                    Data.bulk_create_data(spawned_data)
+                    DataDependency.objects.bulk_create([
+                        DataDependency(parent=parent_data, child=d, kind=DataDependency.KIND_SUBPROCESS)
+                        for d in spawned_data
+                    ])
+
+                    # Copy permissions.
+                    bulk_copy_permissions(parent_data, spawned_data)
 
-                        # Copy permissions.
-                        copy_permissions(parent_data, d)
+                    # Entity is added to the collection only when it is
+                    # created - when it only contains 1 Data object.
+                    entities = Entity.objects.filter(
+                        pk__in=Entity.objects.filter(data__in=spawned_data).values('pk')
+                    ).annotate(num_data=Count('data')).filter(num_data=1)
 
-                        # Entity is added to the collection only when it is
-                        # created - when it only contains 1 Data object.
-                        entities = Entity.objects.filter(data=d).annotate(num_data=Count('data')).filter(num_data=1)
+                    # Copy collections.
+                    for collection in parent_data.collection_set.all():
+                        collection.data.add(*spawned_data)
 
-                        # Copy collections.
-                        for collection in parent_data.collection_set.all():
-                            collection.data.add(d)
+                        # Add entities to which data belongs to the collection.
+                        collection.entity_set.add(*entities)
 
-                            # Add entities to which data belongs to the collection.
-                            for entity in entities:
-                                entity.collections.add(collection)
+                    # Objects were created in bulk, so signals have to be
+                    # sent explicitly once everything is in place.
+                    using = router.db_for_write(Data)
+                    for d in spawned_data:
+                        post_save.send(sender=Data, instance=d, created=True, update_fields=None, raw=False,
+                                       using=using)
 
             if process_rc == 0 and not self.process_failed:
                 self.update_data_status(
@@ -361,11 +406,10 @@ class BaseFlowExecutor(BaseEngine):
                     finished=now()
                 )
 
-            try:
-                # Cleanup after processor
-                data_purge(data_ids=[data_id], delete=True, verbosity=verbosity)
-            except:  # pylint: disable=bare-except
-                logger.error(__("Purge error:\n\n{}", traceback.format_exc()))
+            # Cleanup after processor. Files are purged in a batch by the
+            # manager run triggered by the completion, after the
+            # transaction is committed.
+            self.manager.purge(data_ids=[data_id], verbosity=verbosity)
 
         # if not update_data(data):  # Data was deleted
         #     # Restore original directory
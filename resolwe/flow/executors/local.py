@@ -1,13 +1,16 @@
 """Local workflow executor."""
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import errno
 import logging
 import os
 import shlex
+import signal
 import subprocess
-import time
+import threading
 
 from resolwe.flow.executors import BaseFlowExecutor
+from resolwe.utils import BraceMessage as __
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
@@ -29,9 +32,12 @@ class FlowExecutor(BaseFlowExecutor):
 
     def start(self):
         """Start process execution."""
+        # Run the script in its own session (and process group), so the
+        # whole tree of processes it starts can be signalled at once.
         self.proc = subprocess.Popen(shlex.split(self.command),
                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                                     stderr=subprocess.STDOUT, universal_newlines=True)
+                                     stderr=subprocess.STDOUT, universal_newlines=True,
+                                     preexec_fn=os.setsid)
 
         self.processes[self.data_id] = self.proc
         self.stdout = self.proc.stdout
@@ -46,14 +52,54 @@ class FlowExecutor(BaseFlowExecutor):
     def end(self):
         """End process execution."""
         self.proc.wait()
+        self.processes.pop(self.data_id, None)
 
         return self.proc.returncode
 
+    def _signal_group(self, proc, signum):
+        """Send ``signum`` to the process group led by ``proc``.
+
+        Return ``False`` if the process group no longer exists.
+
+        """
+        try:
+            # Process was started as a session leader, so its pid is
+            # also the id of its process group.
+            os.killpg(proc.pid, signum)
+        except OSError as error:
+            if error.errno == errno.ESRCH:
+                return False
+            raise
+
+        return True
+
+    def _kill_group(self, proc):
+        """Kill the processes of the group that are still running.
+
+        The group is killed even if its leader has already exited, as
+        its children may have ignored ``SIGTERM``. The id of a process
+        group can't be reused while any of its members is alive.
+
+        """
+        if self._signal_group(proc, signal.SIGKILL):
+            logger.warning(__("Process group {} did not terminate and was killed.", proc.pid))
+
     def terminate(self, data_id):
-        """Terminate a running script."""
-        proc = self.processes[data_id]
-        proc.terminate()
+        """Terminate a running script.
+
+        All processes in the script's process group receive ``SIGTERM``
+        and the ones still running after ``kill_delay`` seconds are
+        killed. The escalation runs in the background, so this method
+        returns immediately.
+
+        """
+        proc = self.processes.pop(data_id, None)
+        if proc is None:
+            return
+
+        if not self._signal_group(proc, signal.SIGTERM):
+            return
 
-        time.sleep(self.kill_delay)
-        if proc.poll() is None:
-            proc.kill()
+        timer = threading.Timer(self.kill_delay, self._kill_group, args=(proc,))
+        timer.daemon = True
+        timer.start()
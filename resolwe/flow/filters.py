@@ -7,9 +7,13 @@ Flow Filters
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import json
+
 import rest_framework_filters as filters
 from django_filters.filters import BaseCSVFilter
 
+from django import forms
+
 from .models import Collection, Data, DescriptorSchema, Entity, Process
 
 
@@ -18,6 +22,8 @@ class BaseResolweFilter(filters.FilterSet):
 
     id = filters.AllLookupsFilter()  # pylint: disable=invalid-name
     slug = filters.AllLookupsFilter()
+    # Case-insensitive lookups (e.g. ``name__icontains``) are served by
+    # trigram indexes on names of data objects, collections and entities.
     name = filters.AllLookupsFilter()
     contributor = filters.NumberFilter()
     created = filters.AllLookupsFilter()
@@ -49,7 +55,11 @@ class CollectionFilter(BaseResolweFilter):
 
 
 class TagsFilter(BaseCSVFilter, filters.CharFilter):
-    """Filter for tags."""
+    """Filter for tags.
+
+    Array containment (``@>``) is served by GIN indexes on tags.
+
+    """
 
     def __init__(self, *args, **kwargs):
         """Construct tags filter."""
@@ -69,6 +79,62 @@ class EntityFilter(CollectionFilter):
         model = Entity
 
 
+class JSONContainsField(forms.CharField):
+    """Form field parsing JSON containment and path queries.
+
+    The value is either a JSON object, or a dot-separated path and a
+    value separated by a colon (e.g. ``genome.build:hg19``), which is
+    converted to the equivalent JSON object. The value in a path query
+    is decoded as JSON if possible (use ``key:"19"`` to match a string)
+    and used as a string otherwise.
+
+    """
+
+    def to_python(self, value):
+        """Return the JSON object the value is contained in."""
+        value = super(JSONContainsField, self).to_python(value)
+        if not value:
+            return {}
+
+        try:
+            query = json.loads(value)
+        except ValueError:
+            query = None
+
+        if isinstance(query, dict):
+            return query
+
+        path, separator, path_value = value.partition(':')
+        if not separator or not path:
+            raise forms.ValidationError("Enter a JSON object or a query of form 'path.to.key:value'.")
+
+        try:
+            query = json.loads(path_value)
+        except ValueError:
+            query = path_value
+
+        for key in reversed(path.split('.')):
+            query = {key: query}
+
+        return query
+
+
+class JSONContainsFilter(filters.Filter):
+    """Filter JSON fields by containment of JSON objects.
+
+    Containment (``@>``) is served by GIN indexes on JSON fields, also
+    for path queries, which are converted to containment queries.
+
+    """
+
+    field_class = JSONContainsField
+
+    def __init__(self, *args, **kwargs):
+        """Construct JSON containment filter."""
+        kwargs.setdefault('lookup_expr', 'contains')
+        super(JSONContainsFilter, self).__init__(*args, **kwargs)
+
+
 class ProcessFilter(BaseResolweFilter):
     """Filter the Process endpoint."""
 
@@ -91,6 +157,9 @@ class DataFilter(BaseResolweFilter):
     started = filters.AllLookupsFilter()
     process = filters.RelatedFilter(ProcessFilter)
     tags = TagsFilter()
+    input = JSONContainsFilter()
+    output = JSONContainsFilter()
+    descriptor = JSONContainsFilter()
 
     class Meta:
         """Filter configuration."""
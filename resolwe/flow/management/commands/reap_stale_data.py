@@ -0,0 +1,25 @@
+""".. Ignore pydocstyle D400.
+
+=======================
+Reap Stale Data Objects
+=======================
+
+"""
+from django.core.management.base import BaseCommand
+
+from resolwe.flow.managers import manager
+
+
+class Command(BaseCommand):
+    """Fail or requeue processing Data objects whose executor stopped responding."""
+
+    help = "Fail or requeue processing Data objects whose executor stopped responding."
+
+    def add_arguments(self, parser):
+        """Command arguments."""
+        parser.add_argument('-r', '--requeue', action='store_true', help="requeue stale data objects")
+
+    def handle(self, *args, **options):
+        """Call :meth:`~resolwe.flow.managers.base.BaseManager.reap`."""
+        if manager.reap(requeue=options['requeue'], verbosity=options['verbosity']) and options['requeue']:
+            manager.communicate(verbosity=options['verbosity'])
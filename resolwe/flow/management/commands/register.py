@@ -17,6 +17,7 @@ from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
 from django.db.models import Max
 from django.utils.text import slugify
+from django.utils.timezone import now
 
 from resolwe.flow.engine import InvalidEngineError
 from resolwe.flow.finders import get_finders
@@ -25,6 +26,7 @@ from resolwe.flow.models import DescriptorSchema, Process
 from resolwe.flow.models.base import VERSION_NUMBER_BITS
 from resolwe.flow.models.utils import validation_schema
 from resolwe.flow.utils import iterate_schema
+from resolwe.flow.utils.latest import invalidate_latest_version
 from resolwe.permissions.utils import assign_contributor_permissions, copy_permissions
 
 PROCESSOR_SCHEMA = validation_schema('processor')
@@ -192,7 +194,9 @@ class Command(BaseCommand):
                         self.stdout.write("Skip processor {}: same version installed".format(slug))
                     continue
 
-                process_query.update(**p)
+                # Bump modification time, so cached compiled schemas are not used.
+                process_query.update(modified=now(), **p)
+                invalidate_latest_version(Process, slug)
                 log_processors.append("Updated {}".format(slug))
             else:
                 process = Process.objects.create(contributor=user, **p)
@@ -262,7 +266,8 @@ class Command(BaseCommand):
                         self.stdout.write("Skip descriptor schema {}: same version installed".format(slug))
                     continue
 
-                descriptor_query.update(**descriptor_schema)
+                descriptor_query.update(modified=now(), **descriptor_schema)
+                invalidate_latest_version(DescriptorSchema, slug)
                 log_descriptors.append("Updated {}".format(slug))
             else:
                 descriptor = DescriptorSchema.objects.create(contributor=user, **descriptor_schema)
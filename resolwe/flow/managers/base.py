@@ -7,18 +7,34 @@ Abstract Manager
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import copy
+import datetime
+import errno
 import logging
 import os
+import shutil
+import time
+import traceback
+import uuid
 
 from django.conf import settings
-from django.db import IntegrityError, transaction
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Q
 
 from resolwe.flow.engine import InvalidEngineError, load_engines
 from resolwe.flow.execution_engines import ExecutionError
-from resolwe.flow.models import Data, Process
-from resolwe.flow.utils import iterate_fields
+from resolwe.flow.models import Collection, Data, Entity, Process, Storage
+from resolwe.flow.models.data import failed_inputs_subquery
+from resolwe.flow.utils.purge import data_purge
+from resolwe.flow.utils.schema import get_compiled_schema
+from resolwe.permissions.shortcuts import get_objects_for_user
 from resolwe.utils import BraceMessage as __
 
+if settings.USE_TZ:
+    from django.utils.timezone import now  # pylint: disable=ungrouped-imports
+else:
+    now = datetime.datetime.now  # pylint: disable=invalid-name
+
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
@@ -30,17 +46,16 @@ def dependency_status(data):
     None .. other
 
     """
-    for field_schema, fields in iterate_fields(data.input, data.process.input_schema):
-        if (field_schema['type'].lower().startswith('data:') or
-                field_schema['type'].lower().startswith('list:data:')):
-            name = field_schema['name']
-            value = fields[name]
+    input_schema = get_compiled_schema(data.process, 'input_schema')
+    for field, fields in input_schema.iterate_values(data.input, input_schema.data_fields):
+        if field.name in fields:
+            value = fields[field.name]
 
             # None values are valid and should be ignored.
             if value is None:
                 continue
 
-            if field_schema['type'].lower().startswith('data:'):
+            if field.type.startswith('data:'):
                 value = [value]
 
             for uid in value:
@@ -58,12 +73,181 @@ def dependency_status(data):
     return Data.STATUS_DONE
 
 
+def fail_resolving(queryset, error):
+    """Mark resolving data objects in ``queryset`` as failed.
+
+    All matching objects are failed with a single update. ``post_save``
+    is not sent for them, so the manager is not run once per object;
+    aggregates of collections and entities containing them are updated
+    once instead. If the update deadlocks with a manager running in
+    parallel, it is rolled back and the objects are left for the next
+    manager run.
+
+    :param queryset: data objects to fail
+    :param str error: error message appended to their errors
+    :return: number of failed data objects
+
+    """
+    subquery, params = queryset.filter(status=Data.STATUS_RESOLVING).values('pk').query.sql_with_params()
+
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'UPDATE {table} SET status = %s, process_error = array_append(process_error, %s), '
+                    'process_rc = 1, modified = %s '
+                    'WHERE status = %s AND id IN ({subquery}) RETURNING id'.format(
+                        table=connection.ops.quote_name(Data._meta.db_table),  # pylint: disable=protected-access
+                        subquery=subquery,
+                    ),
+                    [Data.STATUS_ERROR, error, now(), Data.STATUS_RESOLVING] + list(params)
+                )
+                failed_ids = [row[0] for row in cursor.fetchall()]
+
+            if failed_ids:
+                Collection.update_data_aggregates(data_ids=failed_ids)
+                Entity.update_data_aggregates(data_ids=failed_ids)
+    except OperationalError as exp:
+        logger.warning(__("Failed to fail resolving data objects: {}", exp))
+        return 0
+
+    return len(failed_ids)
+
+
+def _link_tree(source, destination):
+    """Hard link files in ``source`` directory tree to ``destination``.
+
+    Files are copied if they cannot be linked, e.g. if directories are
+    on different file systems.
+
+    """
+    for path, _, files in os.walk(source):
+        target_path = os.path.join(destination, os.path.relpath(path, source))
+        try:
+            os.makedirs(target_path)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+
+        for file_name in files:
+            source_file = os.path.join(path, file_name)
+            target_file = os.path.join(target_path, file_name)
+            try:
+                os.link(source_file, target_file)
+            except OSError:
+                shutil.copy2(source_file, target_file)
+
+
+def find_cached(data):
+    """Return a finished data object with the same results as ``data``.
+
+    Only results of processes with ``PERSISTENCE_CACHED`` persistence
+    are reused. Data objects computed with the same process version on
+    the same inputs have the same checksum. Only results of data objects
+    of the same contributor or data objects the contributor can view
+    are reused.
+
+    :return: matching data object or ``None``
+
+    """
+    if data.process.persistence != Process.PERSISTENCE_CACHED:
+        return None
+
+    candidates = Data.objects.filter(
+        checksum=data.checksum,
+        process=data.process,
+        status=Data.STATUS_DONE,
+    ).exclude(pk=data.pk)
+    viewable = get_objects_for_user(data.contributor, 'view_data', candidates)
+    cached = candidates.filter(
+        Q(contributor=data.contributor) | Q(pk__in=viewable.values('pk'))
+    ).order_by('-pk').first()
+
+    # Files of the cached data object are needed to reuse its results.
+    if cached is None or not os.path.isdir(os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], str(cached.pk))):
+        return None
+
+    return cached
+
+
+def reuse_results(data_id, cached_id):
+    """Complete data object with results of ``cached`` data object.
+
+    Files of the cached data object are linked to the data object's
+    directory before any lock is taken. Afterwards the data object is
+    locked, ``basic:json:`` outputs are copied to new storages in bulk
+    and the data object is saved as done, unless it was already handled
+    by another manager in the meantime.
+
+    :param int data_id: id of the resolving data object
+    :param int cached_id: id of the data object with the same results
+        (see :func:`find_cached`)
+
+    """
+    data_dir = settings.FLOW_EXECUTOR['DATA_DIR']
+    try:
+        _link_tree(os.path.join(data_dir, str(cached_id)), os.path.join(data_dir, str(data_id)))
+        link_error = None
+    except (OSError, shutil.Error) as error:
+        link_error = error
+
+    with transaction.atomic():
+        data = Data.objects.select_for_update().filter(pk=data_id).first()
+        # The object might have been updated while linking the files.
+        if data is None or data.status != Data.STATUS_RESOLVING:
+            return
+
+        if link_error is not None:
+            data.status = Data.STATUS_ERROR
+            data.process_error.append("Failed to reuse results of data object {}: {}".format(cached_id, link_error))
+            data.process_rc = 1
+            data.save()
+            return
+
+        cached = Data.objects.get(pk=cached_id)
+        output = copy.deepcopy(cached.output)
+        output_schema = get_compiled_schema(data.process, 'output_schema')
+        storage_fields = [
+            (fields, field.name)
+            for field, fields in output_schema.iterate_values(output, output_schema.json_fields)
+            if field.type.startswith('basic:json:') and isinstance(fields.get(field.name), int)
+        ]
+
+        storages = Storage.objects.in_bulk([fields[name] for fields, name in storage_fields])
+        copies = []
+        for fields, name in storage_fields:
+            storage = copy.copy(storages[fields[name]])
+            storage.pk = None
+            storage.slug = None
+            storage.data = data
+            storage.contributor = data.contributor
+            if storage.json_file:
+                # Storage files are linked together with other files.
+                storage.json_file = os.path.join(str(data.pk), os.path.relpath(storage.json_file, str(cached.pk)))
+            copies.append(storage)
+
+        Storage.bulk_create_with_slugs(copies)
+        for (fields, name), storage in zip(storage_fields, copies):
+            fields[name] = storage.pk
+
+        data.output = output
+        data.status = Data.STATUS_DONE
+        data.process_progress = 100
+        data.process_rc = 0
+        data.process_info.append("Results reused from data object {}".format(cached.pk))
+        data.started = now()
+        data.finished = data.started
+        data.save()
+
+
 class BaseManager(object):
     """Manager handles process job execution."""
 
     def __init__(self):
         """Initialize arguments."""
         self.discover_engines()
+        self._last_reap = 0
+        self._purge_ids = set()
 
     def discover_engines(self):
         """Discover configured engines."""
@@ -91,9 +275,102 @@ class BaseManager(object):
         """Run process."""
         raise NotImplementedError('`run` function not implemented')
 
+    def reap(self, requeue=False, verbosity=1):
+        """Handle processing data objects whose executor stopped responding.
+
+        Data objects in ``STATUS_PROCESSING`` whose heartbeat is older
+        than ``FLOW_EXECUTOR['HEARTBEAT_TIMEOUT']`` seconds are either
+        marked as failed or, if ``requeue`` is set, returned to
+        ``STATUS_RESOLVING`` with their data directory removed, so they
+        are run again.
+
+        Return the number of affected data objects.
+
+        """
+        executor_settings = getattr(settings, 'FLOW_EXECUTOR', {})
+        timeout = executor_settings.get('HEARTBEAT_TIMEOUT', 10 * executor_settings.get('HEARTBEAT_INTERVAL', 30))
+        threshold = now() - datetime.timedelta(seconds=timeout)
+
+        # Executors that stopped before their first heartbeat (or were
+        # started before heartbeats were introduced) never set it.
+        stale_query = (
+            Q(process_heartbeat__lt=threshold) |
+            Q(process_heartbeat__isnull=True, started__lt=threshold)
+        )
+
+        reaped = 0
+        stale_ids = Data.objects.filter(stale_query, status=Data.STATUS_PROCESSING).values_list('pk', flat=True)
+        for data_id in stale_ids:
+            removed_dir = None
+            with transaction.atomic():
+                # The object might have been updated while waiting for the lock.
+                data = Data.objects.select_for_update().filter(
+                    stale_query, pk=data_id, status=Data.STATUS_PROCESSING
+                ).first()
+                if data is None:
+                    continue
+
+                if verbosity >= 1:
+                    print("Reaping stale data object", data.pk)
+
+                if requeue:
+                    # Only move the data directory out of the way while
+                    # holding the lock, it is removed afterwards.
+                    data_dir = os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], str(data.pk))
+                    removed_dir = '{}.reaped-{}'.format(data_dir, uuid.uuid4().hex)
+                    try:
+                        os.rename(data_dir, removed_dir)
+                    except OSError as error:
+                        if error.errno != errno.ENOENT:
+                            raise
+                        removed_dir = None
+
+                    data.status = Data.STATUS_RESOLVING
+                    data.output = {}
+                    data.process_progress = 0
+                    data.process_rc = None
+                    data.process_pid = None
+                    data.process_heartbeat = None
+                    data.started = None
+                else:
+                    data.status = Data.STATUS_ERROR
+                    data.process_error.append("Executor stopped responding")
+                    data.process_rc = 1
+                    data.finished = now()
+
+                data.save()
+                reaped += 1
+
+            if removed_dir:
+                shutil.rmtree(removed_dir, ignore_errors=True)
+
+        if reaped:
+            logger.warning(__("Reaped {} stale data object(s).", reaped))
+
+        return reaped
+
     def communicate(self, run_sync=False, verbosity=1):
         """Resolve task dependencies and run the task."""
+        # Look for data objects with lost executors at most once per
+        # heartbeat interval.
+        reap_interval = getattr(settings, 'FLOW_EXECUTOR', {}).get('HEARTBEAT_INTERVAL', 30)
+        if time.time() - self._last_reap >= reap_interval:
+            self._last_reap = time.time()
+            self.reap(
+                requeue=getattr(settings, 'FLOW_EXECUTOR', {}).get('REQUEUE_STALE', False),
+                verbosity=verbosity,
+            )
+
+        # Fail everything downstream of failed data objects found with a
+        # single query, so deep pipelines do not need a pass per level.
+        fail_resolving(
+            Data.objects.filter(pk__in=failed_inputs_subquery()),
+            "One or more inputs have status ERROR"
+        )
+
         queue = []
+        failed_ids = []
+        reuse = []
         try:
             for data in Data.objects.filter(status=Data.STATUS_RESOLVING):
                 with transaction.atomic():
@@ -115,11 +392,19 @@ class BaseManager(object):
                         data.process_error.append("One or more inputs have status ERROR")
                         data.process_rc = 1
                         data.save()
+
+                        failed_ids.append(data.pk)
                         continue
 
                     elif dep_status != Data.STATUS_DONE:
                         continue
 
+                    cached = find_cached(data)
+                    if cached is not None:
+                        # Files are linked after the lock is released.
+                        reuse.append((data.pk, cached.pk))
+                        continue
+
                     if data.process.run:
                         try:
                             execution_engine = data.process.run.get('language', None)
@@ -163,13 +448,61 @@ class BaseManager(object):
 
         except IntegrityError as exp:
             logger.error(__("IntegrityError in manager {}", exp))
+            self.flush_purge(verbosity=verbosity)
             return
 
+        for data_id, cached_id in reuse:
+            if verbosity >= 1:
+                print("Reusing results of data object", cached_id, "for", data_id)
+            reuse_results(data_id, cached_id)
+
+        if failed_ids:
+            # Nothing downstream of failed objects can succeed, so fail
+            # the whole subgraph at once instead of one object per pass.
+            # This is done after locks of failed objects are released.
+            fail_resolving(
+                Data.objects.filter(pk__in=failed_inputs_subquery(failed_ids)),
+                "One or more inputs have status ERROR"
+            )
+
         for data_id, priority, program in queue:
             if verbosity >= 1:
                 print("Running", program)
             self.run(data_id, program, priority=priority, verbosity=verbosity)
 
+        self.flush_purge(verbosity=verbosity)
+
+    def purge(self, data_ids, verbosity=1):
+        """Schedule purging of files not referenced by finished data objects.
+
+        Executors call this method when they complete data objects. The
+        files are not purged immediately, but for all scheduled data
+        objects at once (see :meth:`flush_purge`) at the end of the
+        manager run, which the completion triggers.
+
+        """
+        self._purge_ids.update(data_ids)
+
+    def flush_purge(self, verbosity=1):
+        """Purge files of all data objects scheduled with :meth:`purge`."""
+        if not self._purge_ids:
+            return
+
+        data_ids = sorted(self._purge_ids)
+        self._purge_ids.clear()
+        try:
+            self.run_purge(data_ids, verbosity=verbosity)
+        except:  # pylint: disable=bare-except
+            logger.error(__("Purge error:\n\n{}", traceback.format_exc()))
+
+    def run_purge(self, data_ids, verbosity=1):
+        """Delete files not referenced by given data objects.
+
+        Managers may override this method to purge in the background.
+
+        """
+        data_purge(data_ids=data_ids, delete=True, verbosity=verbosity)
+
     def get_executor(self):
         """Return an executor instance."""
         return self.executor
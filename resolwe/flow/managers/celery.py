@@ -9,7 +9,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import sys
 
-from ..tasks import celery_run
+from ..tasks import celery_purge, celery_run
 from .base import BaseManager
 
 try:
@@ -29,3 +29,7 @@ class Manager(BaseManager):
             queue = 'hipri'
 
         celery_run.apply_async((data_id, script, verbosity), queue=queue)
+
+    def run_purge(self, data_ids, verbosity=1):
+        """Purge files in a Celery task, so the manager is not blocked."""
+        celery_purge.apply_async((data_ids, verbosity), queue='ordinary')
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2017-10-02 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flow', '0030_change_slug_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='data',
+            name='process_heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2017-10-04 10:21
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flow', '0031_data_process_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storage',
+            name='json_file',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='storage',
+            name='json_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='storage',
+            name='json',
+            field=django.contrib.postgres.fields.jsonb.JSONField(null=True),
+        ),
+    ]
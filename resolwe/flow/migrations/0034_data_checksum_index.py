@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2017-10-05 13:47
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flow', '0033_data_status_index'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='data',
+            index_together=set([('checksum', 'process', 'status')]),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2017-10-06 08:31
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+TABLES = [
+    'flow_collection',
+    'flow_data',
+    'flow_descriptorschema',
+    'flow_entity',
+    'flow_process',
+    'flow_relation',
+    'flow_storage',
+]
+
+
+def slug_sequence_index(table):
+    """Return operation creating index on slug bases and sequences of ``table``."""
+    return migrations.RunSQL(
+        "CREATE INDEX {table}_slug_sequence ON {table} ("
+        "regexp_replace(slug, '-[0-9]{{1,9}}$', ''), "
+        "((substring(slug from '-([0-9]{{1,9}})$'))::integer)"
+        ");".format(table=table),
+        reverse_sql="DROP INDEX {table}_slug_sequence;".format(table=table),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flow', '0034_data_checksum_index'),
+    ]
+
+    operations = [slug_sequence_index(table) for table in TABLES]
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2017-10-09 10:24
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+STATUS_COUNT_FIELDS = (
+    ('UP', 'data_uploading_count'),
+    ('RE', 'data_resolving_count'),
+    ('WT', 'data_waiting_count'),
+    ('PR', 'data_processing_count'),
+    ('OK', 'data_done_count'),
+    ('ER', 'data_error_count'),
+    ('DR', 'data_dirty_count'),
+)
+
+
+def add_aggregate_fields(model_name):
+    """Return operations adding data aggregate fields to ``model_name``."""
+    return [
+        migrations.AddField(
+            model_name=model_name,
+            name='data_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ] + [
+        migrations.AddField(
+            model_name=model_name,
+            name=field_name,
+            field=models.PositiveIntegerField(default=0),
+        )
+        for _, field_name in STATUS_COUNT_FIELDS
+    ] + [
+        migrations.AddField(
+            model_name=model_name,
+            name='latest_date',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
+
+
+def compute_aggregates(model_name):
+    """Return operation computing data aggregates of existing objects of ``model_name``."""
+    return migrations.RunSQL(
+        """
+        UPDATE flow_{model} SET
+            data_count = aggregates.data_count,
+            {set_counts},
+            latest_date = aggregates.latest_date
+        FROM (
+            SELECT
+                membership.{model}_id AS id,
+                COUNT(*) AS data_count,
+                {counts},
+                MAX(data.modified) AS latest_date
+            FROM flow_{model}_data AS membership
+            JOIN flow_data AS data ON data.id = membership.data_id
+            GROUP BY membership.{model}_id
+        ) AS aggregates
+        WHERE flow_{model}.id = aggregates.id;
+        """.format(
+            model=model_name,
+            set_counts=', '.join(
+                '{field} = aggregates.{field}'.format(field=field_name)
+                for _, field_name in STATUS_COUNT_FIELDS
+            ),
+            counts=', '.join(
+                "COUNT(*) FILTER (WHERE data.status = '{status}') AS {field}".format(status=status, field=field_name)
+                for status, field_name in STATUS_COUNT_FIELDS
+            ),
+        ),
+        reverse_sql=migrations.RunSQL.noop,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flow', '0035_slug_sequence_indexes'),
+    ]
+
+    operations = (
+        add_aggregate_fields('collection') +
+        add_aggregate_fields('entity') +
+        [
+            compute_aggregates('collection'),
+            compute_aggregates('entity'),
+        ]
+    )
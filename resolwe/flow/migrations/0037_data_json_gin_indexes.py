@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2017-10-10 13:47
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+FIELDS = [
+    'input',
+    'output',
+    'descriptor',
+]
+
+
+def json_gin_index(field):
+    """Return operation creating GIN index supporting containment queries on ``field`` of data."""
+    return migrations.RunSQL(
+        "CREATE INDEX flow_data_{field}_gin ON flow_data USING gin ({field} jsonb_path_ops);".format(field=field),
+        reverse_sql="DROP INDEX flow_data_{field}_gin;".format(field=field),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flow', '0036_collection_data_aggregates'),
+    ]
+
+    operations = [json_gin_index(field) for field in FIELDS]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2017-10-11 08:05
+from __future__ import unicode_literals
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+NAME_TABLES = [
+    'flow_collection',
+    'flow_data',
+    'flow_entity',
+]
+
+TAGS_TABLES = [
+    'flow_data',
+    'flow_entity',
+]
+
+
+def name_trigram_index(table):
+    """Return operation creating trigram index on names of ``table``.
+
+    The indexed expression matches the one Django uses for
+    case-insensitive lookups (``icontains``, ``istartswith``, ...).
+
+    """
+    return migrations.RunSQL(
+        "CREATE INDEX {table}_name_trgm ON {table} USING gin (UPPER(name::text) gin_trgm_ops);".format(table=table),
+        reverse_sql="DROP INDEX {table}_name_trgm;".format(table=table),
+    )
+
+
+def tags_gin_index(table):
+    """Return operation creating GIN index on tags of ``table``."""
+    return migrations.RunSQL(
+        "CREATE INDEX {table}_tags_gin ON {table} USING gin (tags);".format(table=table),
+        reverse_sql="DROP INDEX {table}_tags_gin;".format(table=table),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flow', '0037_data_json_gin_indexes'),
+    ]
+
+    operations = (
+        [TrigramExtension()] +
+        [name_trigram_index(table) for table in NAME_TABLES] +
+        [tags_gin_index(table) for table in TAGS_TABLES]
+    )
@@ -34,6 +34,10 @@ Postgres ORM model for keeping the data structured.
 .. autoclass:: resolwe.flow.models.DataDependency
     :members:
 
+.. autofunction:: resolwe.flow.models.data.lineage_subquery
+
+.. autofunction:: resolwe.flow.models.data.failed_inputs_subquery
+
 DescriptorSchema model
 ======================
 
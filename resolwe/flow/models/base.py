@@ -64,3 +64,31 @@ class BaseModel(models.Model):
                 raise
         else:
             raise IntegrityError("Maximum number of retries exceeded during slug generation")
+
+    @classmethod
+    def bulk_create_with_slugs(cls, instances):
+        """Insert ``instances`` with a single query.
+
+        Slugs of all instances are allocated in one pass (see
+        :meth:`~resolwe.flow.models.fields.ResolweSlugField.allocate_slugs`)
+        and the insert is retried in case of concurrently created
+        conflicting slugs. No signals are sent.
+
+        """
+        slug_field = cls._meta.get_field('slug')
+        for _ in range(MAX_SLUG_RETRIES):
+            slug_field.allocate_slugs(instances)
+            try:
+                with transaction.atomic():
+                    cls.objects.bulk_create(instances)
+                    break
+            except IntegrityError as error:
+                # Retry in case of concurrently created conflicting slugs.
+                if '{}_slug'.format(cls._meta.db_table) in error.args[0]:
+                    for instance in instances:
+                        instance.slug = None
+                    continue
+
+                raise
+        else:
+            raise IntegrityError("Maximum number of retries exceeded during slug generation")
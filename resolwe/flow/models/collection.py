@@ -1,12 +1,28 @@
 """Resolwe collection model."""
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from collections import OrderedDict
+
 from django.contrib.postgres.fields import JSONField
-from django.db import models
+from django.db import connection, models
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 
 from .base import BaseModel
 from .utils import DirtyError, validate_schema
 
+#: names of fields with numbers of data objects by their status (keys
+#: are values of ``Data.STATUS_*`` constants)
+DATA_STATUS_COUNT_FIELDS = OrderedDict([
+    ('UP', 'data_uploading_count'),
+    ('RE', 'data_resolving_count'),
+    ('WT', 'data_waiting_count'),
+    ('PR', 'data_processing_count'),
+    ('OK', 'data_done_count'),
+    ('ER', 'data_error_count'),
+    ('DR', 'data_dirty_count'),
+])
+
 
 class BaseCollection(BaseModel):
     """Template for Postgres model for storing a collection."""
@@ -32,8 +48,36 @@ class BaseCollection(BaseModel):
     #: indicate whether `descriptor` doesn't match `descriptor_schema` (is dirty)
     descriptor_dirty = models.BooleanField(default=False)
 
-    def save(self, *args, **kwargs):
-        """Perform descriptor validation and save object."""
+    #: number of data objects (maintained by signal handlers)
+    data_count = models.PositiveIntegerField(default=0)
+
+    #: number of uploading data objects (maintained by signal handlers)
+    data_uploading_count = models.PositiveIntegerField(default=0)
+
+    #: number of resolving data objects (maintained by signal handlers)
+    data_resolving_count = models.PositiveIntegerField(default=0)
+
+    #: number of waiting data objects (maintained by signal handlers)
+    data_waiting_count = models.PositiveIntegerField(default=0)
+
+    #: number of processing data objects (maintained by signal handlers)
+    data_processing_count = models.PositiveIntegerField(default=0)
+
+    #: number of done data objects (maintained by signal handlers)
+    data_done_count = models.PositiveIntegerField(default=0)
+
+    #: number of failed data objects (maintained by signal handlers)
+    data_error_count = models.PositiveIntegerField(default=0)
+
+    #: number of dirty data objects (maintained by signal handlers)
+    data_dirty_count = models.PositiveIntegerField(default=0)
+
+    #: latest modification date of data objects when they were added,
+    #: removed or changed status (maintained by signal handlers)
+    latest_date = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    def validate_descriptor(self):
+        """Validate descriptor and set ``descriptor_dirty`` flag."""
         if self.descriptor_schema:
             try:
                 validate_schema(self.descriptor, self.descriptor_schema.schema)  # pylint: disable=no-member
@@ -43,8 +87,96 @@ class BaseCollection(BaseModel):
         elif self.descriptor and self.descriptor != {}:
             raise ValueError("`descriptor_schema` must be defined if `descriptor` is given")
 
+    def save(self, *args, **kwargs):
+        """Perform descriptor validation and save object."""
+        self.validate_descriptor()
         super(BaseCollection, self).save()
 
+    @classmethod
+    def update_data_aggregates(cls, pks=None, data_ids=None):
+        """Recompute aggregates of data objects with a single query.
+
+        Aggregates are recomputed for objects with primary keys in
+        ``pks`` and for objects containing data objects with ids in
+        ``data_ids``. If neither is given, aggregates of all objects are
+        recomputed, e.g. to repair them.
+
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        through = cls.data.through
+        query_params = {
+            'table': table,
+            'through': connection.ops.quote_name(through._meta.db_table),
+            'column': connection.ops.quote_name(through._meta.get_field(cls._meta.model_name).column),
+            'data_table': connection.ops.quote_name(cls.data.field.related_model._meta.db_table),
+        }
+
+        conditions = []
+        condition_params = []
+        if pks is not None:
+            conditions.append('{table}.id = ANY(%s)'.format(**query_params))
+            condition_params.append(list(pks))
+        if data_ids is not None:
+            conditions.append(
+                '{table}.id IN (SELECT {column} FROM {through} WHERE data_id = ANY(%s))'.format(**query_params)
+            )
+            condition_params.append(list(data_ids))
+        if conditions and not any(condition_params):
+            return
+
+        query_params['where'] = 'WHERE {}'.format(' OR '.join(conditions)) if conditions else ''
+        query_params['status_counts'] = ', '.join(
+            'COUNT(data.id) FILTER (WHERE data.status = %s) AS {}'.format(field_name)
+            for field_name in DATA_STATUS_COUNT_FIELDS.values()
+        )
+        query_params['set_status_counts'] = ', '.join(
+            '{field} = aggregates.{field}'.format(field=field_name)
+            for field_name in DATA_STATUS_COUNT_FIELDS.values()
+        )
+
+        with connection.cursor() as cursor:
+            # Objects without data objects are kept by the outer joins.
+            cursor.execute(
+                """
+                UPDATE {table} SET
+                    data_count = aggregates.data_count,
+                    {set_status_counts},
+                    latest_date = aggregates.latest_date
+                FROM (
+                    SELECT
+                        {table}.id,
+                        COUNT(data.id) AS data_count,
+                        {status_counts},
+                        MAX(data.modified) AS latest_date
+                    FROM {table}
+                    LEFT JOIN {through} AS membership ON membership.{column} = {table}.id
+                    LEFT JOIN {data_table} AS data ON data.id = membership.data_id
+                    {where}
+                    GROUP BY {table}.id
+                ) AS aggregates
+                WHERE {table}.id = aggregates.id
+                """.format(**query_params),
+                list(DATA_STATUS_COUNT_FIELDS.keys()) + condition_params
+            )
+
+    @classmethod
+    def update_status_counts(cls, data_id, old_status, new_status, modified):
+        """Move a data object between status counters of objects containing it.
+
+        Counters are changed in place with a single query, without
+        looking at other data objects. ``old_status`` must be the status
+        stored in the database, read while the data object is locked.
+        ``latest_date`` is moved forward to ``modified``.
+
+        """
+        old_field = DATA_STATUS_COUNT_FIELDS[old_status]
+        new_field = DATA_STATUS_COUNT_FIELDS[new_status]
+        cls.objects.filter(data=data_id).update(**{
+            old_field: F(old_field) - 1,
+            new_field: F(new_field) + 1,
+            'latest_date': Greatest('latest_date', Value(modified, output_field=models.DateTimeField())),
+        })
+
 
 class Collection(BaseCollection):
     """Postgres model for storing a collection."""
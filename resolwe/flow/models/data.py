@@ -1,7 +1,9 @@
 """Reslowe process model."""
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import collections
 import copy
+import hashlib
 import json
 import os
 
@@ -11,12 +13,15 @@ from django.conf import settings
 from django.contrib.postgres.fields import ArrayField, JSONField
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models, transaction
-
-from guardian.shortcuts import assign_perm
+from django.db import connection, models, router, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import m2m_changed, post_save
 
 from resolwe.flow.expression_engines.exceptions import EvaluationError
-from resolwe.flow.utils import dict_dot, get_data_checksum, iterate_fields, iterate_schema
+from resolwe.flow.utils import dict_dot, get_data_checksum
+from resolwe.flow.utils.latest import get_latest_version
+from resolwe.flow.utils.schema import compile_schema, get_compiled_schema
+from resolwe.permissions.utils import bulk_assign_contributor_permissions
 
 from .base import BaseModel
 from .descriptor import DescriptorSchema
@@ -37,6 +42,10 @@ class Data(BaseModel):
     class Meta(BaseModel.Meta):
         """Data Meta options."""
 
+        index_together = (
+            # Lookups of cached results.
+            ('checksum', 'process', 'status'),
+        )
         permissions = (
             ("view_data", "Can view data"),
             ("edit_data", "Can edit data"),
@@ -86,7 +95,7 @@ class Data(BaseModel):
         )
     ])
 
-    status = models.CharField(max_length=2, choices=STATUS_CHOICES, default=STATUS_RESOLVING)
+    status = models.CharField(max_length=2, choices=STATUS_CHOICES, default=STATUS_RESOLVING, db_index=True)
     """
     :class:`Data` status
 
@@ -106,6 +115,11 @@ class Data(BaseModel):
     #: process id
     process_pid = models.PositiveIntegerField(blank=True, null=True)
 
+    #: date and time of the last executor heartbeat (periodically set by
+    #: :meth:`resolwe.flow.executors.BaseFlowExecutor.run` while the
+    #: process is running)
+    process_heartbeat = models.DateTimeField(blank=True, null=True)
+
     #: progress
     process_progress = models.PositiveSmallIntegerField(default=0)
 
@@ -150,17 +164,87 @@ class Data(BaseModel):
     #: tags for categorizing objects
     tags = ArrayField(models.CharField(max_length=255), default=list)
 
+    #: fields whose changes are tracked to skip unnecessary work on save
+    TRACKED_FIELDS = ('status', 'process_id', 'descriptor_schema_id', 'input', 'output', 'descriptor')
+
+    #: tracked JSON fields, whose fingerprints are tracked instead of values
+    TRACKED_JSON_FIELDS = ('input', 'output', 'descriptor')
+
     def __init__(self, *args, **kwargs):
         """Initialize attributes."""
         super(Data, self).__init__(*args, **kwargs)
         self._original_name = self.name
+        self._original_values = self._get_tracked_values() if self.pk is not None else {}
+        #: status stored in the database before the last save, if saved
+        self._stored_status = None
+
+    @staticmethod
+    def _get_json_fingerprint(value):
+        """Return fingerprint of a JSON value, used to detect its changes."""
+        return hashlib.sha256(json.dumps(value, default=six.text_type).encode('utf-8')).digest()
+
+    def _get_tracked_values(self, field_names=None):
+        """Return snapshot of loaded tracked fields.
+
+        Deferred fields are skipped, so they are not loaded. Instead of
+        copies of JSON fields, only their fingerprints are kept.
+
+        :param list field_names: only include these tracked fields
+
+        """
+        values = {}
+        for field_name in self.TRACKED_FIELDS:
+            if field_name not in self.__dict__ or (field_names is not None and field_name not in field_names):
+                continue
+
+            value = self.__dict__[field_name]
+            if field_name in self.TRACKED_JSON_FIELDS:
+                value = self._get_json_fingerprint(value)
+            values[field_name] = value
+
+        return values
+
+    def get_dirty_fields(self, field_names=None):
+        """Return names of tracked fields changed since the object was loaded or saved.
+
+        All tracked fields (see :attr:`TRACKED_FIELDS`) are dirty if the
+        object has not been saved yet. Fields that were deferred when
+        the object was loaded are dirty once they are loaded. JSON
+        fields (see :attr:`TRACKED_JSON_FIELDS`) are compared by their
+        fingerprints, so in-place changes are detected as well.
+
+        :param list field_names: only check these tracked fields
+
+        """
+        field_names = [
+            field_name for field_name in self.TRACKED_FIELDS
+            if field_names is None or field_name in field_names
+        ]
+        if self.pk is None:
+            return set(field_names)
+
+        dirty = set()
+        for field_name, value in self._get_tracked_values(field_names).items():
+            if field_name not in self._original_values or self._original_values[field_name] != value:
+                dirty.add(field_name)
+
+        return dirty
+
+    def refresh_from_db(self, *args, **kwargs):
+        """Reload field values from the database."""
+        super(Data, self).refresh_from_db(*args, **kwargs)
+        self._original_values.update(self._get_tracked_values())
 
     def save_storage(self, instance, schema):
         """Save basic:json values to a Storage collection."""
-        for field_schema, fields in iterate_fields(instance, schema):
-            name = field_schema['name']
+        schema = compile_schema(schema)
+        for field, fields in schema.iterate_values(instance, schema.json_fields):
+            name = field.name
+            if name not in fields:
+                continue
+
             value = fields[name]
-            if field_schema.get('type', '').startswith('basic:json:'):
+            if field.type.startswith('basic:json:'):
                 if value and not self.pk:
                     raise ValidationError(
                         'Data object must be `created` before creating `basic:json:` fields')
@@ -193,28 +277,54 @@ class Data(BaseModel):
                 # `value` is copied by value, so `fields[name]` must be changed
                 fields[name] = storage.pk
 
+    def ancestors(self):
+        """Return all data objects this data object (transitively) depends on."""
+        return Data.objects.filter(pk__in=lineage_subquery([self.pk]))
+
+    def descendants(self):
+        """Return all data objects that (transitively) depend on this data object."""
+        return Data.objects.filter(pk__in=lineage_subquery([self.pk], descendants=True))
+
+    def get_dependency_ids(self, instance, schema):
+        """Return ids of data objects referenced in ``data:`` and ``list:data:`` fields."""
+        dependency_ids = set()
+        schema = compile_schema(schema)
+        for field, fields in schema.iterate_values(instance, schema.data_fields):
+            if field.name not in fields:
+                continue
+
+            value = fields[field.name]
+            if field.type.startswith('data:'):
+                dependency_ids.add(value)
+            elif field.type.startswith('list:data:'):
+                dependency_ids.update(value)
+
+        dependency_ids.discard(None)
+        return dependency_ids
+
     def save_dependencies(self, instance, schema):
-        """Save data: and list:data: references as parents."""
-        def add_dependency(value):
-            """Add parent Data dependency."""
-            try:
-                DataDependency.objects.update_or_create(
-                    parent=Data.objects.get(pk=value),
-                    child=self,
-                    defaults={'kind': DataDependency.KIND_IO},
-                )
-            except Data.DoesNotExist:
-                pass
+        """Save data: and list:data: references as parents.
 
-        for field_schema, fields in iterate_fields(instance, schema):
-            name = field_schema['name']
-            value = fields[name]
+        Existing parents are fetched with a single query and missing
+        dependencies are created in bulk. References to non-existing
+        data objects are ignored and dependencies that already exist
+        are not duplicated.
+
+        """
+        parent_ids = set(Data.objects.filter(
+            pk__in=self.get_dependency_ids(instance, schema)
+        ).values_list('pk', flat=True))
+        if not parent_ids:
+            return
+
+        existing = DataDependency.objects.filter(child=self, parent_id__in=parent_ids)
+        existing.exclude(kind=DataDependency.KIND_IO).update(kind=DataDependency.KIND_IO)
+        existing_ids = set(existing.values_list('parent_id', flat=True))
 
-            if field_schema.get('type', '').startswith('data:'):
-                add_dependency(value)
-            elif field_schema.get('type', '').startswith('list:data:'):
-                for data in value:
-                    add_dependency(data)
+        DataDependency.objects.bulk_create([
+            DataDependency(parent_id=parent_id, child=self, kind=DataDependency.KIND_IO)
+            for parent_id in sorted(parent_ids - existing_ids)
+        ])
 
     def create_entity(self):
         """Create entity if `flow_collection` is defined in process.
@@ -229,40 +339,101 @@ class Data(BaseModel):
         any `Entity`, create new `Entity`
 
         """
-        ds_slug = self.process.flow_collection  # pylint: disable=no-member
-        if ds_slug:
-            entity_query = Entity.objects.filter(data__in=self.parents.all()).distinct()  # pylint: disable=no-member
+        Data.bulk_create_entities([self])
 
-            if entity_query.count() == 1:
-                entity = entity_query.first()
-            else:
+    @classmethod
+    def bulk_create_entities(cls, instances):
+        """Add many saved data objects to entities at once.
 
-                descriptor_schema = DescriptorSchema.objects.filter(slug=ds_slug).latest()
-                entity = Entity.objects.create(
-                    contributor=self.contributor,
-                    descriptor_schema=descriptor_schema,
-                    name=self.name,
-                    tags=self.tags,
+        Entities are chosen by the same rules as in
+        :meth:`create_entity`. Entities of parents of all objects are
+        fetched with a single query, new entities are inserted with a
+        single query and their permissions and memberships are inserted
+        in bulk. Signals for created entities and changed memberships
+        are sent afterwards.
+
+        """
+        instances = [instance for instance in instances if instance.process.flow_collection]
+        if not instances:
+            return
+
+        parent_entities = collections.defaultdict(set)
+        for child_id, entity_id in Entity.data.through.objects.filter(
+                data__children_dependency__child__in=instances
+        ).values_list('data__children_dependency__child', 'entity'):
+            parent_entities[child_id].add(entity_id)
+
+        # Identifiers of existing entities mapped to data joining them.
+        existing_members = collections.OrderedDict()
+        # Pairs of new entities and data they are created for.
+        new_members = []
+        for instance in instances:
+            entity_ids = parent_entities[instance.pk]
+            if len(entity_ids) == 1:
+                existing_members.setdefault(next(iter(entity_ids)), []).append(instance)
+            else:
+                entity = Entity(
+                    contributor=instance.contributor,
+                    descriptor_schema=get_latest_version(DescriptorSchema, instance.process.flow_collection),
+                    name=instance.name,
+                    tags=instance.tags,
+                )
+                entity.validate_descriptor()
+                new_members.append((entity, instance))
+
+        new_entities = [entity for entity, _ in new_members]
+        Entity.bulk_create_with_slugs(new_entities)
+        bulk_assign_contributor_permissions(new_entities)
+
+        Entity.data.through.objects.bulk_create([
+            Entity.data.through(entity_id=entity.pk, data_id=instance.pk) for entity, instance in new_members
+        ] + [
+            Entity.data.through(entity_id=entity_id, data_id=instance.pk)
+            for entity_id, entity_data in existing_members.items()
+            for instance in entity_data
+        ])
+
+        using = router.db_for_write(Entity)
+        for entity in new_entities:
+            post_save.send(sender=Entity, instance=entity, created=True, update_fields=None, raw=False, using=using)
+
+        if m2m_changed.has_listeners(Entity.data.through):
+            members = [(entity, [instance]) for entity, instance in new_members]
+            existing_entities = Entity.objects.in_bulk(list(existing_members.keys()))
+            members.extend(
+                (existing_entities[entity_id], entity_data) for entity_id, entity_data in existing_members.items()
+            )
+            for entity, entity_data in members:
+                m2m_changed.send(
+                    sender=Entity.data.through, instance=entity, action='post_add', reverse=False,
+                    model=Data, pk_set={instance.pk for instance in entity_data}, using=using,
                 )
 
-                for permission in list(zip(*entity._meta.permissions))[0]:  # pylint: disable=protected-access
-                    assign_perm(permission, entity.contributor, entity)
+    def prepare_save(self, render_name=False, update_fields=None):
+        """Prepare the data object for saving.
 
-            entity.data.add(self)
+        Apply input defaults, render the name and the descriptor,
+        compute the checksum, move ``basic:json:`` outputs to storage
+        and validate the object against the process schemas. If
+        ``update_fields`` are given, only changes of these fields are
+        taken into account.
 
-    def save(self, render_name=False, *args, **kwargs):
-        """Save the data model."""
+        """
         # Generate the descriptor if one is not already set.
         if self.name != self._original_name:
             self.named_by_user = True
 
         create = self.pk is None
+        if update_fields is not None:
+            update_fields = [self._meta.get_field(field_name).attname for field_name in update_fields]
+        dirty = self.get_dirty_fields(update_fields)
+        input_schema = get_compiled_schema(self.process, 'input_schema')
+        output_schema = get_compiled_schema(self.process, 'output_schema')
         if create:
             # Default values for INPUT
-            input_schema = self.process.input_schema  # pylint: disable=no-member
-            for field_schema, fields, path in iterate_schema(self.input, input_schema):
-                if 'default' in field_schema and field_schema['name'] not in fields:
-                    dict_dot(self.input, path, field_schema['default'])
+            for field, fields in input_schema.iterate_values(self.input, input_schema.default_fields):
+                if field.name not in fields:
+                    dict_dot(self.input, field.path, field.schema['default'])
 
             if not self.name:
                 self._render_name()
@@ -270,50 +441,126 @@ class Data(BaseModel):
                 self.named_by_user = True
 
             self.checksum = get_data_checksum(
-                self.input, self.process.slug, self.process.version)  # pylint: disable=no-member
+                self.input, self.process.slug, self.process.version, input_schema)  # pylint: disable=no-member
 
-        elif render_name:
+        elif render_name or 'input' in dirty:
+            # Name is rendered from inputs.
             self._render_name()
 
-        self.save_storage(self.output, self.process.output_schema)  # pylint: disable=no-member
+        # Each of the following stages only depends on some of the fields,
+        # so it is skipped if none of them changed, e.g. on renaming.
+        output_changed = bool(dirty & {'output', 'process_id'})
+        status_changed = 'status' in dirty
+        descriptor_changed = bool(dirty & {'descriptor', 'descriptor_schema_id', 'process_id', 'input'})
+
+        if output_changed:
+            self.save_storage(self.output, output_schema)
 
-        if self.status != Data.STATUS_ERROR:
+        if (output_changed or status_changed) and self.status != Data.STATUS_ERROR:
             hydrate_size(self)
 
         if create:
-            validate_schema(self.input, self.process.input_schema)  # pylint: disable=no-member
+            validate_schema(self.input, input_schema)
 
-        render_descriptor(self)
+        if descriptor_changed:
+            render_descriptor(self)
 
-        if self.descriptor_schema:
-            try:
-                validate_schema(self.descriptor, self.descriptor_schema.schema)  # pylint: disable=no-member
-                self.descriptor_dirty = False
-            except DirtyError:
-                self.descriptor_dirty = True
-        elif self.descriptor and self.descriptor != {}:
-            raise ValueError("`descriptor_schema` must be defined if `descriptor` is given")
+            if self.descriptor_schema:
+                try:
+                    validate_schema(self.descriptor, get_compiled_schema(self.descriptor_schema, 'schema'))
+                    self.descriptor_dirty = False
+                except DirtyError:
+                    self.descriptor_dirty = True
+            elif self.descriptor and self.descriptor != {}:
+                raise ValueError("`descriptor_schema` must be defined if `descriptor` is given")
 
-        if self.status != Data.STATUS_ERROR:
+        if (output_changed or status_changed) and self.status != Data.STATUS_ERROR:
             path_prefix = os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], str(self.pk))
-            output_schema = self.process.output_schema  # pylint: disable=no-member
             if self.status == Data.STATUS_DONE:
                 validate_schema(self.output, output_schema, path_prefix=path_prefix)
             else:
                 validate_schema(self.output, output_schema, path_prefix=path_prefix,
                                 test_required=False)
 
+    def save(self, render_name=False, *args, **kwargs):
+        """Save the data model."""
+        create = self.pk is None
+        update_fields = kwargs.get('update_fields', None)
+        self.prepare_save(render_name=render_name, update_fields=update_fields)
+
         with transaction.atomic():
+            self._stored_status = None
+            if not create and (update_fields is None or 'status' in update_fields):
+                # Lock the row, so concurrent saves move the status counters
+                # of collections and entities one after another.
+                self._stored_status = Data.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values_list('status', flat=True).first()
+
             super(Data, self).save(*args, **kwargs)
 
             # We can only save dependencies after the data object has been saved. This
             # is why a transaction block is needed and the save method must be called first.
             if create:
-                self.save_dependencies(self.input, self.process.input_schema)  # pylint: disable=no-member
+                self.save_dependencies(self.input, get_compiled_schema(self.process, 'input_schema'))
+
+        if update_fields is None:
+            self._original_values = self._get_tracked_values()
+        else:
+            # Fields that were not saved are still changed.
+            self._original_values.update(self._get_tracked_values(
+                [self._meta.get_field(field_name).attname for field_name in update_fields]
+            ))
 
         if create:
             self.create_entity()
 
+    @classmethod
+    def bulk_create_data(cls, instances):
+        """Create many new data objects at once.
+
+        Objects are prepared with :meth:`prepare_save` and inserted
+        with a single query. Their slugs are allocated in one pass and
+        their input dependencies are created in bulk.
+
+        ``post_save`` signals are not sent, so the caller is responsible
+        for sending them once all related objects (permissions,
+        collections, ...) are in place.
+
+        :param list instances: unsaved :class:`Data` objects
+        :return: list of created objects with primary keys set
+
+        """
+        if not instances:
+            return []
+
+        for instance in instances:
+            instance.prepare_save()
+
+        cls.bulk_create_with_slugs(instances)
+
+        for instance in instances:
+            instance._original_values = instance._get_tracked_values()  # pylint: disable=protected-access
+
+        parent_ids = [
+            instance.get_dependency_ids(instance.input, get_compiled_schema(instance.process, 'input_schema'))
+            for instance in instances
+        ]
+        existing_ids = set(Data.objects.filter(
+            pk__in=set().union(*parent_ids)
+        ).values_list('pk', flat=True))
+
+        DataDependency.objects.bulk_create([
+            DataDependency(parent_id=parent_id, child=instance, kind=DataDependency.KIND_IO)
+            for instance, instance_parent_ids in zip(instances, parent_ids)
+            for parent_id in instance_parent_ids
+            if parent_id in existing_ids
+        ])
+
+        cls.bulk_create_entities(instances)
+
+        return instances
+
     def _render_name(self):
         """Render data name.
 
@@ -325,7 +572,7 @@ class Data(BaseModel):
             return
 
         inputs = copy.deepcopy(self.input)
-        hydrate_input_references(inputs, self.process.input_schema, hydrate_values=False)  # pylint: disable=no-member
+        hydrate_input_references(inputs, get_compiled_schema(self.process, 'input_schema'), hydrate_values=False)
         template_context = inputs
 
         try:
@@ -362,3 +609,82 @@ class DataDependency(models.Model):
     parent = models.ForeignKey(Data, on_delete=models.CASCADE, related_name='children_dependency')
     #: kind of dependency
     kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+
+
+def lineage_subquery(data_ids, descendants=False):
+    """Return subquery selecting ids of ancestors or descendants of ``data_ids``.
+
+    The dependency graph is walked with a single recursive query, so it
+    can be used to select whole subgraphs, e.g.
+    ``Data.objects.filter(pk__in=lineage_subquery(ids))``. Given data
+    objects are not included, unless they are part of a cycle.
+
+    Results are not cached: dependencies are created in bulk and removed
+    by cascading deletes, neither of which sends signals to invalidate a
+    cache, and the recursive query only walks the dependency indexes.
+
+    :param list data_ids: ids of data objects
+    :param bool descendants: select descendants instead of ancestors
+    :rtype: ~django.db.models.expressions.RawSQL
+
+    """
+    if descendants:
+        this_column, next_column = 'parent_id', 'child_id'
+    else:
+        this_column, next_column = 'child_id', 'parent_id'
+
+    sql = (
+        'WITH RECURSIVE lineage(id) AS ('
+        'SELECT {next} FROM {table} WHERE {this} = ANY(%s) '
+        'UNION '
+        'SELECT dependency.{next} FROM {table} dependency JOIN lineage ON dependency.{this} = lineage.id'
+        ') SELECT id FROM lineage'
+    ).format(
+        table=connection.ops.quote_name(DataDependency._meta.db_table),  # pylint: disable=protected-access
+        this=this_column,
+        next=next_column,
+    )
+
+    return RawSQL(sql, [list(data_ids)])
+
+
+def failed_inputs_subquery(data_ids=None):
+    """Return subquery selecting resolving data objects with failed inputs.
+
+    Selected are resolving data objects that take an input from a
+    failed data object (or from one of ``data_ids``, if given), directly
+    or through other resolving data objects. The whole set is selected
+    with a single recursive query that only follows input/output
+    dependencies of resolving data objects.
+
+    :param list data_ids: ids of failed data objects to start from
+    :rtype: ~django.db.models.expressions.RawSQL
+
+    """
+    if data_ids is None:
+        root_condition = 'parent.status = %s'
+        params = [Data.STATUS_ERROR]
+    else:
+        root_condition = 'parent.id = ANY(%s)'
+        params = [list(data_ids)]
+
+    sql = (
+        'WITH RECURSIVE failed(id) AS ('
+        'SELECT dependency.child_id FROM {dependency} dependency '
+        'JOIN {data} parent ON parent.id = dependency.parent_id '
+        'JOIN {data} child ON child.id = dependency.child_id '
+        'WHERE {root} AND dependency.kind = %s AND child.status = %s '
+        'UNION '
+        'SELECT dependency.child_id FROM {dependency} dependency '
+        'JOIN failed ON dependency.parent_id = failed.id '
+        'JOIN {data} child ON child.id = dependency.child_id '
+        'WHERE dependency.kind = %s AND child.status = %s'
+        ') SELECT id FROM failed'
+    ).format(
+        dependency=connection.ops.quote_name(DataDependency._meta.db_table),  # pylint: disable=protected-access
+        data=connection.ops.quote_name(Data._meta.db_table),  # pylint: disable=protected-access
+        root=root_condition,
+    )
+    params.extend([DataDependency.KIND_IO, Data.STATUS_RESOLVING] * 2)
+
+    return RawSQL(sql, params)
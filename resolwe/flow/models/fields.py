@@ -1,6 +1,8 @@
 """Custom database fields."""
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from collections import OrderedDict
+
 from six import string_types
 
 from django.db import DatabaseError, connection
@@ -10,6 +12,12 @@ from django.utils.text import slugify
 
 MAX_SLUG_SEQUENCE_DIGITS = 9
 
+# Expressions splitting slugs into the base and the sequence. They must
+# match expressions of slug sequence indexes (see migrations), so that
+# the largest sequence is found with an index scan.
+SLUG_BASE_EXPRESSION = "regexp_replace({column}, '-[0-9]{{1,9}}$', '')"
+SLUG_SEQUENCE_EXPRESSION = "(substring({column} from '-([0-9]{{1,9}})$'))::integer"
+
 
 class ResolweSlugField(SlugField):
     """Slug field."""
@@ -88,8 +96,8 @@ class ResolweSlugField(SlugField):
             attr = getattr(instance, self.populate_from)
             return attr() if callable(attr) else attr
 
-    def pre_save(self, instance, add):
-        """Ensure slug uniqunes before save."""
+    def _get_slug_base(self, instance):
+        """Return the slug before the sequence is appended to it."""
         slug = self.value_from_object(instance)
 
         if not slug and self.populate_from:
@@ -110,74 +118,130 @@ class ResolweSlugField(SlugField):
             # Make sure that potentially added sequence won't excede maximal length.
             slug = slug[:(self.max_length - MAX_SLUG_SEQUENCE_DIGITS - 1)]
 
-            constraints_placeholder, constraints_values = self._get_unique_constraints(instance)
-
-            instance_pk_name = instance._meta.pk.name  # pylint: disable=protected-access
-
-            # Safe values - make sure that there is no chance of SQL injection.
-            query_params = {
-                'constraints_placeholder': constraints_placeholder,
-                'slug_column': connection.ops.quote_name(self.column),
-                'slug_len': len(slug),
-                'table_name': connection.ops.quote_name(self.model._meta.db_table),  # pylint: disable=protected-access
-                'pk_neq_placeholder': 'AND {} != %(instance_pk)s'.format(instance_pk_name) if instance.pk else ''
-            }
-
-            # SQL injection unsafe values - will be escaped.
-            # Keys prefixed with `unique_` are reserved for `constraints_values` dict.
-            query_escape_params = {
-                'slug': slug,
-                'slug_regex': '^{}(-[0-9]*)?$'.format(slug),
-            }
-            query_escape_params.update(constraints_values)
-            if instance.pk:
-                query_escape_params['instance_pk'] = instance.pk
-
-            with connection.cursor() as cursor:
-                # TODO: Slowest part of this query is `MAX` function. It can
-                #       be optimized by indexing slug column by slug sequence.
-                #       https://www.postgresql.org/docs/9.4/static/indexes-expressional.html
-                cursor.execute(
-                    """
-                    SELECT
-                        CASE
-                            WHEN (
-                                EXISTS(
-                                    SELECT 1 FROM {table_name} WHERE (
-                                        {slug_column} = %(slug)s
-                                        {pk_neq_placeholder}
-                                        {constraints_placeholder}
-                                    )
-                                )
-                            ) THEN MAX(slug_sequence) + 1
-                            ELSE NULL
-                        END
-                    FROM (
-                        SELECT COALESCE(
-                            NULLIF(
-                                RIGHT({slug_column}, -{slug_len}-1),
-                                ''
-                            ),
-                            '1'
-                        )::text::integer AS slug_sequence
-                        FROM {table_name} WHERE (
-                            {slug_column} ~ %(slug_regex)s
+        return slug
+
+    def _get_slug_sequence(self, instance, slug):
+        """Return the state of ``slug`` in the database.
+
+        Return a tuple of two elements, where the first one tells if
+        ``slug`` itself is already taken and the second one is the
+        highest sequence used with ``slug`` (``None`` if there is no
+        such slug).
+        """
+        constraints_placeholder, constraints_values = self._get_unique_constraints(instance)
+
+        instance_pk_name = instance._meta.pk.name  # pylint: disable=protected-access
+
+        # Safe values - make sure that there is no chance of SQL injection.
+        query_params = {
+            'constraints_placeholder': constraints_placeholder,
+            'slug_column': connection.ops.quote_name(self.column),
+            'table_name': connection.ops.quote_name(self.model._meta.db_table),  # pylint: disable=protected-access
+            'pk_neq_placeholder': 'AND {} != %(instance_pk)s'.format(instance_pk_name) if instance.pk else ''
+        }
+
+        # SQL injection unsafe values - will be escaped.
+        # Keys prefixed with `unique_` are reserved for `constraints_values` dict.
+        query_escape_params = {
+            'slug': slug,
+        }
+        query_escape_params.update(constraints_values)
+        if instance.pk:
+            query_escape_params['instance_pk'] = instance.pk
+
+        query_params['slug_base'] = SLUG_BASE_EXPRESSION.format(column=query_params['slug_column'])
+        query_params['slug_sequence'] = SLUG_SEQUENCE_EXPRESSION.format(column=query_params['slug_column'])
+
+        with connection.cursor() as cursor:
+            # Both subqueries are served by indexes, on the slug and on
+            # the (slug base, slug sequence) expressions, so no slugs
+            # with the same base have to be scanned.
+            cursor.execute(
+                """
+                SELECT
+                    EXISTS(
+                        SELECT 1 FROM {table_name} WHERE (
+                            {slug_column} = %(slug)s
+                            {pk_neq_placeholder}
+                            {constraints_placeholder}
+                        )
+                    ),
+                    (
+                        SELECT MAX({slug_sequence}) FROM {table_name} WHERE (
+                            {slug_base} = %(slug)s
                             {pk_neq_placeholder}
                             {constraints_placeholder}
                         )
-                    ) AS tmp
-                    """.format(**query_params),
-                    params=query_escape_params
-                )
-                result = cursor.fetchone()[0]
-
-            if result is not None:
-                if len(str(result)) > MAX_SLUG_SEQUENCE_DIGITS:
-                    raise DatabaseError(
-                        'Auto-generated slug sequence too long - please choose a different slug.'
                     )
+                """.format(**query_params),
+                params=query_escape_params
+            )
+            exists, max_sequence = cursor.fetchone()
+
+        if exists and max_sequence is None:
+            # The slug itself is the first one in the sequence.
+            max_sequence = 1
+
+        return exists, max_sequence
+
+    def _format_slug(self, slug, sequence):
+        """Append ``sequence`` to ``slug``."""
+        if len(str(sequence)) > MAX_SLUG_SEQUENCE_DIGITS:
+            raise DatabaseError(
+                'Auto-generated slug sequence too long - please choose a different slug.'
+            )
+
+        return '{}-{}'.format(slug, sequence)
+
+    def allocate_slugs(self, instances):
+        """Generate unique slugs for a batch of unsaved instances.
+
+        Instances with the same slug (and the same values of fields in
+        ``unique_with``) are numbered consecutively with a single query
+        per group, so slugs do not collide within the batch. Allocated
+        slugs are used by the following :meth:`pre_save` call without
+        querying the database again.
+        """
+        groups = OrderedDict()
+        for instance in instances:
+            slug = self._get_slug_base(instance)
+            if not slug:
+                setattr(instance, self.name, slug)
+                continue
+
+            _, constraints_values = self._get_unique_constraints(instance)
+            key = (slug, tuple(sorted(constraints_values.items())) if constraints_values else ())
+            groups.setdefault(key, []).append(instance)
+
+        for (slug, _), group in groups.items():
+            exists, max_sequence = self._get_slug_sequence(group[0], slug)
+
+            sequence = (max_sequence or 1) + 1
+            for instance in group:
+                if exists:
+                    value = self._format_slug(slug, sequence)
+                    sequence += 1
+                else:
+                    value = slug
+                    exists = True
+
+                setattr(instance, self.name, value)
+                setattr(instance, '_{}_allocated'.format(self.name), True)
 
-                slug = '{}-{}'.format(slug, result)
+    def pre_save(self, instance, add):
+        """Ensure slug uniqunes before save."""
+        allocated_attr = '_{}_allocated'.format(self.name)
+        if add and getattr(instance, allocated_attr, False):
+            # Slug was already generated by `allocate_slugs`.
+            delattr(instance, allocated_attr)
+            return self.value_from_object(instance)
+
+        slug = self._get_slug_base(instance)
+
+        if slug:
+            exists, max_sequence = self._get_slug_sequence(instance, slug)
+            if exists:
+                slug = self._format_slug(slug, max_sequence + 1)
 
             # Make the updated slug available as instance attribute.
             setattr(instance, self.name, slug)
@@ -1,41 +1,388 @@
 """Resolwe storage model."""
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import collections
+import errno
+import json
+import os
+import uuid
+import zipfile
+
+from django.conf import settings
 from django.contrib.postgres.fields import JSONField
-from django.db import models
+from django.db import connection, models, transaction
 
 from .base import BaseModel
 
+#: default maximal size (in bytes of serialized JSON) of storages kept
+#: in :class:`StorageLoader`'s cache
+STORAGE_CACHE_SIZE = 64 * 1024 * 1024
+
+#: name of the directory (in data object's directory) with storages
+#: stored outside of the database
+EXTERNAL_STORAGE_DIR = '.storage'
+
+#: default number of list items stored together in an external storage
+EXTERNAL_CHUNK_SIZE = 1000
+
+
+def _get_item(value, key):
+    """Return item of a JSON object or array (if ``key`` is an index)."""
+    if isinstance(value, list):
+        return value[int(key)]
+    return value[key]
+
+
+def _select(value, path=None, start=None, stop=None, columns=None):
+    """Select a part of a JSON value.
+
+    Return the value at ``path``, sliced from ``start`` to ``stop``.
+    If ``columns`` are given, only those items are kept in each item
+    (row) of the sliced list.
+
+    """
+    for key in path or []:
+        value = _get_item(value, key)
+
+    if start is not None or stop is not None:
+        value = value[start:stop]
+
+    if columns is not None:
+        value = [
+            [_get_item(row, column) for column in columns] if isinstance(row, list)
+            else {column: row[column] for column in columns}
+            for row in value
+        ]
+
+    return value
+
+
+def _remove_file(path):
+    """Remove file at ``path`` if it exists."""
+    try:
+        os.remove(path)
+    except OSError as error:
+        if error.errno != errno.ENOENT:
+            raise
+
+
+class ExternalJSON(object):
+    """JSON stored compressed in a file.
+
+    JSON is stored in a zip archive, so that its parts can be read
+    without reading the whole document. Values of a JSON object are
+    stored as separate members and items of a JSON array are stored in
+    chunks of :data:`EXTERNAL_CHUNK_SIZE` items.
+
+    """
+
+    def __init__(self, path):
+        """Initialize attributes."""
+        self.path = path
+
+    def write(self, value, chunk_size=EXTERNAL_CHUNK_SIZE):
+        """Write ``value`` to the file."""
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            if isinstance(value, dict):
+                index = {'type': 'object', 'keys': list(value.keys())}
+                for i, key in enumerate(index['keys']):
+                    archive.writestr('{}.json'.format(i), json.dumps(value[key]))
+            elif isinstance(value, list):
+                index = {'type': 'array', 'length': len(value), 'chunk_size': chunk_size}
+                for i in range(0, len(value), chunk_size):
+                    archive.writestr('{}.json'.format(i // chunk_size), json.dumps(value[i:i + chunk_size]))
+            else:
+                index = {'type': 'value'}
+                archive.writestr('value.json', json.dumps(value))
+
+            archive.writestr('index.json', json.dumps(index))
+
+    def read(self, path=None, start=None, stop=None, columns=None):
+        """Read a part of the JSON.
+
+        Only archive members that contain the requested part are read.
+        See :meth:`Storage.read_json` for the description of arguments.
+
+        """
+        path = list(path or [])
+        with zipfile.ZipFile(self.path, 'r') as archive:
+            def load(name):
+                """Load archive member."""
+                return json.loads(archive.read(name).decode('utf-8'))
+
+            index = load('index.json')
+
+            if index['type'] == 'object':
+                if path:
+                    key = path.pop(0)
+                    if key not in index['keys']:
+                        raise KeyError(key)
+                    value = load('{}.json'.format(index['keys'].index(key)))
+                else:
+                    value = {key: load('{}.json'.format(i)) for i, key in enumerate(index['keys'])}
+
+            elif index['type'] == 'array':
+                chunk_size = index['chunk_size']
+                if path:
+                    item = int(path.pop(0))
+                    if item < 0:
+                        item += index['length']
+                    if not 0 <= item < index['length']:
+                        raise IndexError(item)
+                    value = load('{}.json'.format(item // chunk_size))[item % chunk_size]
+                else:
+                    # Only read chunks with the items in the slice.
+                    first, last, _ = slice(start, stop).indices(index['length'])
+                    value = []
+                    if first < last:
+                        for chunk in range(first // chunk_size, (last - 1) // chunk_size + 1):
+                            value.extend(load('{}.json'.format(chunk)))
+                        offset = first // chunk_size * chunk_size
+                        value = value[first - offset:last - offset]
+                    start = stop = None
+
+            else:
+                value = load('value.json')
+
+        return _select(value, path, start, stop, columns)
+
 
 class Storage(BaseModel):
-    """Postgres model for storing storages."""
+    """Postgres model for storing storages.
+
+    If the ``FLOW_STORAGE['EXTERNAL_THRESHOLD']`` setting is set, JSON
+    larger than the given number of bytes is stored compressed in the
+    data object's directory (see :class:`ExternalJSON`) instead of in
+    the database. Use :meth:`get_json` and :meth:`read_json` to read
+    the JSON regardless of where it is stored.
+
+    """
 
     #: corresponding data object
     data = models.ForeignKey('Data')
 
-    #: actual JSON stored
-    json = JSONField()
+    #: actual JSON stored (``None`` if it is stored in a file)
+    json = JSONField(null=True)
+
+    #: path of the file with JSON (relative to the data directory)
+    json_file = models.CharField(max_length=255, null=True, blank=True)
+
+    #: size of the JSON stored in the file
+    json_size = models.BigIntegerField(null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        """Save the model.
+
+        Large JSON is moved to a file if it is configured so. The file
+        with the previous JSON is removed once the transaction is
+        committed.
+
+        """
+        previous_json_file = None
+        if self.json is not None:
+            # JSON was set, so the file with the previous JSON (if any)
+            # is replaced, whether the new JSON is moved to a file or not.
+            previous_json_file = self.json_file
+            self.json_file = None
+            self.json_size = None
+
+            threshold = getattr(settings, 'FLOW_STORAGE', {}).get('EXTERNAL_THRESHOLD', None)
+            if threshold is not None:
+                size = len(json.dumps(self.json))
+                if size > threshold:
+                    file_name = '{}.zip'.format(uuid.uuid4().hex)
+                    self.json_file = os.path.join(str(self.data_id), EXTERNAL_STORAGE_DIR, file_name)
+                    self.json_size = size
+                    ExternalJSON(self._get_json_file_path()).write(
+                        self.json,
+                        chunk_size=getattr(settings, 'FLOW_STORAGE', {}).get('CHUNK_SIZE', EXTERNAL_CHUNK_SIZE)
+                    )
+                    self.json = None
+
+        super(Storage, self).save(*args, **kwargs)
+
+        if previous_json_file and previous_json_file != self.json_file:
+            previous_path = os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], previous_json_file)
+            transaction.on_commit(lambda: _remove_file(previous_path))
+
+    def _get_json_file_path(self):
+        """Return absolute path of the file with JSON."""
+        return os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], self.json_file)
+
+    def get_json(self):
+        """Return stored JSON."""
+        if self.json_file:
+            return ExternalJSON(self._get_json_file_path()).read()
+        return self.json
+
+    def read_json(self, path=None, start=None, stop=None, columns=None):
+        """Read a part of stored JSON.
+
+        If the ``json`` field is deferred, only the requested part of
+        JSON stored in the database is fetched. Only the needed parts
+        of JSON stored in a file are read.
+
+        :param list path: keys (or indices of array items) leading to
+            the value
+        :param int start: start of the slice of the (array) value
+        :param int stop: end of the slice of the (array) value
+        :param list columns: keys (or indices) of items to select from
+            each item (row) of the sliced array
+        :return: selected part of JSON
+
+        """
+        if self.json_file:
+            return ExternalJSON(self._get_json_file_path()).read(path, start, stop, columns)
+
+        if 'json' not in self.get_deferred_fields():
+            return _select(self.json, path, start, stop, columns)
+
+        path = [str(key) for key in path or []]
+        with connection.cursor() as cursor:
+            # JSON null is returned as None, but only a missing path
+            # results in SQL NULL.
+            cursor.execute(
+                'SELECT json #> %s, json #> %s IS NULL FROM {} WHERE id = %s'.format(self._meta.db_table),
+                [path, path, self.pk]
+            )
+            value, missing = cursor.fetchone()
+
+        if missing:
+            raise KeyError('.'.join(path))
+
+        return _select(value, None, start, stop, columns)
+
+
+class StorageLoader(object):
+    """Batch loader of `json` attributes of `Storage` objects.
+
+    Ids of storages that will be needed are registered with
+    :meth:`register`. When a storage is requested, it is fetched
+    together with other registered storages that are not loaded yet,
+    as many as fit in the cache. Sizes of registered storages are
+    fetched first, so that a batch never exceeds the cache size.
+
+    Loaded storages are kept in a least recently used cache, limited by
+    the total size of storages' serialized JSON.
+
+    """
+
+    def __init__(self, max_size=STORAGE_CACHE_SIZE):
+        """Initialize the cache."""
+        self.max_size = max_size
+        self._pending = set()
+        self._sizes = {}
+        self._cache = collections.OrderedDict()
+        self._size = 0
+
+    def register(self, pk):
+        """Register storage id to be loaded with the next query."""
+        if pk not in self._cache:
+            self._pending.add(pk)
+
+    def get(self, pk):
+        """Return `json` attribute of the storage with ``pk``."""
+        if pk in self._cache:
+            size, value = self._cache.pop(pk)
+            # Re-insert the storage to mark it as recently used.
+            self._cache[pk] = (size, value)
+            return value
+
+        self._pending.add(pk)
+        self._load(pk)
+
+        if pk not in self._cache:
+            raise Storage.DoesNotExist("Storage matching query does not exist (id: {}).".format(pk))
+
+        return self._cache[pk][1]
+
+    def _load_sizes(self):
+        """Fetch sizes of pending storages with unknown sizes."""
+        unknown = self._pending.difference(self._sizes)
+        if not unknown:
+            return
+
+        storages = Storage.objects.filter(pk__in=unknown).annotate(
+            db_json_size=models.Func(
+                models.F('json'), function='octet_length', template='%(function)s(%(expressions)s::text)',
+                output_field=models.IntegerField(),
+            )
+        ).values_list('id', 'json_file', 'json_size', 'db_json_size')
+
+        for storage_id, json_file, json_size, db_json_size in storages:
+            self._sizes[storage_id] = json_size if json_file else db_json_size or 0
+
+        # Storages that do not exist are not loaded.
+        self._pending.intersection_update(self._sizes)
+
+    def _load(self, pk):
+        """Fetch storage with ``pk`` and pending storages that fit in the cache."""
+        self._load_sizes()
+        if pk not in self._pending:
+            return
+
+        batch = [pk]
+        batch_size = self._sizes[pk]
+        for other_pk in sorted(self._pending):
+            if other_pk != pk and batch_size + self._sizes[other_pk] <= self.max_size:
+                batch.append(other_pk)
+                batch_size += self._sizes[other_pk]
+
+        self._pending.difference_update(batch)
+        sizes = {batch_pk: self._sizes.pop(batch_pk) for batch_pk in batch}
+
+        # Make room for the batch before it is loaded.
+        self._evict(self.max_size - batch_size)
+
+        storages = Storage.objects.filter(pk__in=batch).only('id', 'name', 'json', 'json_file', 'json_size')
+        # The requested storage is added last, as the most recently used one.
+        for storage in sorted(storages, key=lambda storage: storage.pk == pk):
+            self._cache[storage.pk] = (sizes[storage.pk], storage.get_json())
+            self._size += sizes[storage.pk]
+
+    def _evict(self, max_size):
+        """Remove least recently used storages until the cache fits ``max_size``."""
+        while self._size > max_size and self._cache:
+            _, (size, _) = self._cache.popitem(last=False)
+            self._size -= size
 
 
 class LazyStorageJSON(object):
-    """Lazy load `json` attribute of `Storage` object."""
+    """Lazy load `json` attribute of `Storage` object.
 
-    def __init__(self, **kwargs):
+    If ``loader`` (:class:`StorageLoader`) is given, the storage is
+    loaded through it, together with other storages registered to it.
+
+    """
+
+    def __init__(self, loader=None, **kwargs):
         """Initialize private attributes."""
         self._kwargs = kwargs
         self._json = None
 
+        self._loader = loader
+        if self._loader is not None:
+            self._loader.register(self._kwargs['pk'])
+
     def _get_storage(self):
         """Load `json` field from `Storage` object."""
+        if self._loader is not None:
+            # JSON is kept in the loader's cache, so that its memory
+            # usage is bounded.
+            return self._loader.get(self._kwargs['pk'])
+
         if self._json is None:
-            self._json = Storage.objects.get(**self._kwargs).json
+            self._json = Storage.objects.get(**self._kwargs).get_json()
+        return self._json
 
     def __getitem__(self, key):
         """Access by key."""
-        self._get_storage()
-        return self._json[key]
+        return self._get_storage()[key]
 
     def __repr__(self):
         """Format the object representation."""
-        self._get_storage()
-        return self._json.__repr__()
+        return self._get_storage().__repr__()
@@ -13,7 +13,8 @@ from django.conf import settings
 from django.contrib.staticfiles import finders
 from django.core.exceptions import ValidationError
 
-from resolwe.flow.utils import dict_dot, iterate_fields, iterate_schema
+from resolwe.flow.utils import dict_dot
+from resolwe.flow.utils.schema import compile_schema, get_compiled_schema
 
 # TODO: Python 3.5 imports modules in a different (lazy) way, so when
 #       Python 2.7 and Python 3.4 support is dropped, data module can be
@@ -25,7 +26,7 @@ from resolwe.flow.utils import dict_dot, iterate_fields, iterate_schema
 #       as:
 #
 #           data_model.Data
-from .storage import LazyStorageJSON, Storage
+from .storage import LazyStorageJSON, Storage, StorageLoader
 
 
 class DirtyError(ValidationError):
@@ -58,6 +59,65 @@ def validation_schema(name):
 
 TYPE_SCHEMA = validation_schema('type')
 
+TYPE_VALIDATOR = jsonschema.Draft4Validator(TYPE_SCHEMA)
+
+# Types whose values can be checked without a JSON schema validator.
+_NATIVE_TYPE_CHECKS = {
+    'string': lambda value: isinstance(value, six.string_types),
+    'boolean': lambda value: isinstance(value, bool),
+    'integer': lambda value: isinstance(value, six.integer_types) and not isinstance(value, bool),
+    'decimal': lambda value: isinstance(value, six.integer_types + (float,)) and not isinstance(value, bool),
+    'json': lambda value: isinstance(value, six.integer_types + (float,)) and not isinstance(value, bool),
+}
+
+# Cache of value validators, keyed by field type.
+_TYPE_VALUE_VALIDATORS = {}
+
+
+def get_type_value_validator(type_):
+    """Return a function that checks if a value is valid for ``type_``.
+
+    The returned function returns ``True`` if the value matches the
+    ``value`` part of the definition in ``TYPE_SCHEMA`` that matches
+    ``type_``. Validators are compiled once per type and cached. If no
+    type definition matches ``type_``, ``None`` is returned.
+
+    """
+    if type_ in _TYPE_VALUE_VALIDATORS:
+        return _TYPE_VALUE_VALIDATORS[type_]
+
+    validator = None
+    for name, type_schema in TYPE_SCHEMA['types'].items():
+        if re.search(type_schema['properties']['type']['pattern'], type_):
+            if name in _NATIVE_TYPE_CHECKS:
+                validator = _NATIVE_TYPE_CHECKS[name]
+            else:
+                validator = jsonschema.Draft4Validator(type_schema['properties']['value']).is_valid
+            break
+
+    _TYPE_VALUE_VALIDATORS[type_] = validator
+    return validator
+
+
+def validate_type(type_, value):
+    """Check that ``value`` is valid for field type ``type_``.
+
+    Values are checked with cached per-type validators. Only if the
+    check fails, the value is validated against the whole
+    ``TYPE_SCHEMA`` to get a descriptive error message.
+
+    :raises ValidationError: if ``value`` is not valid
+
+    """
+    validator = get_type_value_validator(type_)
+    if validator is not None and validator(value):
+        return
+
+    try:
+        TYPE_VALIDATOR.validate([{"type": type_, "value": value}])
+    except jsonschema.exceptions.ValidationError as ex:
+        raise ValidationError(ex.message)
+
 
 def validate_schema(instance, schema, test_required=True, path_prefix=None):
     """Check if DictField values are consistent with our data types.
@@ -80,7 +140,8 @@ def validate_schema(instance, schema, test_required=True, path_prefix=None):
         fields) exists
 
     :param list instance: Instance to be validated
-    :param list schema: Schema for validation
+    :param schema: Schema for validation
+    :type schema: list or :class:`~resolwe.flow.utils.schema.CompiledSchema`
     :param bool test_required: Flag for testing if all required fields
         are present. It is usefule if validation is run before ``Data``
         object is finished and there are some field stil missing
@@ -127,24 +188,45 @@ def validate_schema(instance, schema, test_required=True, path_prefix=None):
 
             validate_refs(field)
 
-    def validate_data(data_pk, type_):
-        """Check that `Data` objects exist and is of right type."""
+    def validate_data(data_refs):
+        """Check that `Data` objects exist and are of right type."""
         from .data import Data  # prevent circular import
 
-        data_qs = Data.objects.filter(pk=data_pk).values('process__type')
-        if not data_qs.exists():
-            raise ValidationError(
-                "Referenced `Data` object does not exist (id:{})".format(data_pk))
-        data = data_qs.first()
-        if not data['process__type'].startswith(type_):
-            raise ValidationError(
-                "Data object of type `{}` is required, but type `{}` is given. "
-                "(id:{})".format(type_, data['process__type'], data_pk))
+        if not data_refs:
+            return
+
+        data_types = dict(
+            Data.objects.filter(pk__in={data_pk for data_pk, _ in data_refs}).values_list('pk', 'process__type')
+        )
+        for data_pk, type_ in data_refs:
+            if data_pk not in data_types:
+                raise ValidationError(
+                    "Referenced `Data` object does not exist (id:{})".format(data_pk))
+            if not data_types[data_pk].startswith(type_):
+                raise ValidationError(
+                    "Data object of type `{}` is required, but type `{}` is given. "
+                    "(id:{})".format(type_, data_types[data_pk], data_pk))
+
+    def validate_storage(storage_refs):
+        """Check that `Storage` objects exist."""
+        if not storage_refs:
+            return
+
+        storage_pks = set(Storage.objects.filter(pk__in=set(storage_refs)).values_list('pk', flat=True))
+        for storage_pk in storage_refs:
+            if storage_pk not in storage_pks:
+                raise ValidationError(
+                    "Referenced `Storage` object does not exist (id:{})".format(storage_pk))
 
     is_dirty = False
     dirty_fields = []
-    for _schema, _fields, _ in iterate_schema(instance, schema):
-        name = _schema['name']
+    # References are collected and checked with one query per model.
+    data_refs = []
+    storage_refs = []
+    schema = compile_schema(schema)
+    for schema_field, _fields in schema.iterate_values(instance):
+        _schema = schema_field.schema
+        name = schema_field.name
         is_required = _schema.get('required', True)
 
         if test_required and is_required and name not in _fields:
@@ -153,16 +235,13 @@ def validate_schema(instance, schema, test_required=True, path_prefix=None):
 
         if name in _fields:
             field = _fields[name]
-            type_ = _schema.get('type', "")
+            type_ = schema_field.type
 
             # Treat None as if the field is missing.
             if not is_required and field is None:
                 continue
 
-            try:
-                jsonschema.validate([{"type": type_, "value": field}], TYPE_SCHEMA)
-            except jsonschema.exceptions.ValidationError as ex:
-                raise ValidationError(ex.message)
+            validate_type(type_, field)
 
             choices = [choice['value'] for choice in _schema.get('choices', [])]
             allow_custom_choice = _schema.get('allow_custom_choice', False)
@@ -186,20 +265,22 @@ def validate_schema(instance, schema, test_required=True, path_prefix=None):
                 for obj in field:
                     validate_dir(obj)
 
-            elif type_ == 'basic:json:' and not Storage.objects.filter(pk=field).exists():
-                raise ValidationError(
-                    "Referenced `Storage` object does not exist (id:{})".format(field))
+            elif type_ == 'basic:json:':
+                storage_refs.append(field)
 
             elif type_.startswith('data:'):
-                validate_data(field, type_)
+                data_refs.append((field, type_))
 
             elif type_.startswith('list:data:'):
                 for data_id in field:
-                    validate_data(data_id, type_[5:])  # remove `list:` from type
+                    data_refs.append((data_id, type_[5:]))  # remove `list:` from type
+
+    validate_storage(storage_refs)
+    validate_data(data_refs)
 
     try:
         # Check that schema definitions exist for all fields
-        for _, _ in iterate_fields(instance, schema):
+        for _, _ in schema.iterate_fields(instance):
             pass
     except KeyError as ex:
         raise ValidationError(str(ex))
@@ -209,11 +290,12 @@ def validate_schema(instance, schema, test_required=True, path_prefix=None):
         raise DirtyError("Required fields {} not given.".format(', '.join(dirty_fields)))
 
 
-def _hydrate_values(output, output_schema, data):
+def _hydrate_values(output, output_schema, data, storage_loader=None):
     """Hydrate basic:file and basic:json values.
 
     Find fields with basic:file type and assign a full path to the file.
     Find fields with basic:json type and assign a JSON object from storage.
+    JSON objects are loaded through ``storage_loader`` if it is given.
 
     """
     def hydrate_path(file_name):
@@ -226,31 +308,35 @@ def _hydrate_values(output, output_schema, data):
 
     def hydrate_storage(storage_id):
         """Hydrate storage fields."""
-        return LazyStorageJSON(pk=storage_id)
+        return LazyStorageJSON(loader=storage_loader, pk=storage_id)
+
+    output_schema = compile_schema(output_schema)
+    schema_fields = output_schema.file_fields + output_schema.dir_fields + output_schema.json_fields
+    for field, fields in output_schema.iterate_values(output, schema_fields):
+        name = field.name
+        if name not in fields:
+            continue
 
-    for field_schema, fields in iterate_fields(output, output_schema):
-        name = field_schema['name']
         value = fields[name]
-        if 'type' in field_schema:
-            if field_schema['type'].startswith('basic:file:'):
-                value['file'] = hydrate_path(value['file'])
+        if field.type.startswith('basic:file:'):
+            value['file'] = hydrate_path(value['file'])
 
-            elif field_schema['type'].startswith('list:basic:file:'):
-                for obj in value:
-                    obj['file'] = hydrate_path(obj['file'])
+        elif field.type.startswith('list:basic:file:'):
+            for obj in value:
+                obj['file'] = hydrate_path(obj['file'])
 
-            if field_schema['type'].startswith('basic:dir:'):
-                value['dir'] = hydrate_path(value['dir'])
+        elif field.type.startswith('basic:dir:'):
+            value['dir'] = hydrate_path(value['dir'])
 
-            elif field_schema['type'].startswith('list:basic:dir:'):
-                for obj in value:
-                    obj['dir'] = hydrate_path(obj['dir'])
+        elif field.type.startswith('list:basic:dir:'):
+            for obj in value:
+                obj['dir'] = hydrate_path(obj['dir'])
 
-            elif field_schema['type'].startswith('basic:json:'):
-                fields[name] = hydrate_storage(value)
+        elif field.type.startswith('basic:json:'):
+            fields[name] = hydrate_storage(value)
 
-            elif field_schema['type'].startswith('list:basic:json:'):
-                fields[name] = [hydrate_storage(storage_id) for storage_id in value]
+        elif field.type.startswith('list:basic:json:'):
+            fields[name] = [hydrate_storage(storage_id) for storage_id in value]
 
 
 def hydrate_input_references(input_, input_schema, hydrate_values=True):
@@ -259,53 +345,64 @@ def hydrate_input_references(input_, input_schema, hydrate_values=True):
     Find fields with complex data:<...> types in ``input_``.
     Assign an output of corresponding data object to those fields.
 
+    All referenced data objects are fetched with a single query. Each
+    of them is hydrated once and its output is shared by all fields
+    that reference it, so hydrated outputs must not be modified.
+
     """
     from .data import Data  # prevent circular import
 
-    for field_schema, fields in iterate_fields(input_, input_schema):
-        name = field_schema['name']
-        value = fields[name]
-        if 'type' in field_schema:
-            if field_schema['type'].startswith('data:'):
-                # if re.match('^[0-9a-fA-F]{24}$', str(value)) is None:
-                #     print "ERROR: data:<...> value in field \"{}\", type \"{}\" not ObjectId but {}.".format(
-                #         name, field_schema['type'], value)
-                if value is None:
-                    continue
-
-                data = Data.objects.get(id=value)
-                output = copy.deepcopy(data.output)
-                # static = Data.static.to_python(data.static)
-                if hydrate_values:
-                    _hydrate_values(output, data.process.output_schema, data)
-                    # _hydrate_values(static, data.static_schema, data)
-                output["__id"] = data.id
-                output["__type"] = data.process.type
-                output["__descriptor"] = data.descriptor
-                fields[name] = output
-
-            elif field_schema['type'].startswith('list:data:'):
-                outputs = []
-                for val in value:
-                    # if re.match('^[0-9a-fA-F]{24}$', str(val)) is None:
-                    #     print "ERROR: data:<...> value in {}, type \"{}\" not ObjectId but {}.".format(
-                    #         name, field_schema['type'], val)
-                    if val is None:
-                        continue
-
-                    data = Data.objects.get(id=val)
-                    output = copy.deepcopy(data.output)
-                    # static = Data.static.to_python(data.static)
-                    if hydrate_values:
-                        _hydrate_values(output, data.process.output_schema, data)
-                        # _hydrate_values(static, data.static_schema, data)
-
-                    output["__id"] = data.id
-                    output["__type"] = data.process.type
-                    output["__descriptor"] = data.descriptor
-                    outputs.append(output)
-
-                fields[name] = outputs
+    input_schema = compile_schema(input_schema)
+    references = []
+    for field, fields in input_schema.iterate_values(input_, input_schema.data_fields):
+        if field.name in fields:
+            references.append((field, fields))
+
+    data_ids = set()
+    for field, fields in references:
+        value = fields[field.name]
+        if field.type.startswith('data:'):
+            data_ids.add(value)
+        else:
+            data_ids.update(value)
+    data_ids.discard(None)
+
+    if not data_ids:
+        return
+
+    data_qs = Data.objects.filter(pk__in=data_ids).select_related('process').only(
+        # Name is accessed when Data objects are initialized.
+        'id', 'name', 'output', 'descriptor', 'process__type', 'process__version', 'process__modified',
+        'process__output_schema',
+    )
+
+    # Storages of all referenced objects are loaded together.
+    storage_loader = StorageLoader()
+    outputs = {}
+    for data in data_qs:
+        # Objects are fetched only for hydration, so their outputs
+        # can be changed without copying them.
+        output = data.output
+        if hydrate_values:
+            _hydrate_values(output, get_compiled_schema(data.process, 'output_schema'), data, storage_loader)
+        output["__id"] = data.id
+        output["__type"] = data.process.type
+        output["__descriptor"] = data.descriptor
+        outputs[data.id] = output
+
+    def get_output(data_id):
+        """Return hydrated output of the data object."""
+        if data_id not in outputs:
+            raise Data.DoesNotExist("Data matching query does not exist (id: {}).".format(data_id))
+        return outputs[data_id]
+
+    for field, fields in references:
+        value = fields[field.name]
+        if field.type.startswith('data:'):
+            if value is not None:
+                fields[field.name] = get_output(value)
+        else:
+            fields[field.name] = [get_output(data_id) for data_id in value if data_id is not None]
 
 
 def hydrate_input_uploads(input_, input_schema, hydrate_values=True):
@@ -316,15 +413,16 @@ def hydrate_input_uploads(input_, input_schema, hydrate_values=True):
 
     """
     files = []
-    for field_schema, fields in iterate_fields(input_, input_schema):
-        name = field_schema['name']
-        value = fields[name]
-        if 'type' in field_schema:
-            if field_schema['type'] == 'basic:file:':
-                files.append(value)
+    input_schema = compile_schema(input_schema)
+    for field, fields in input_schema.iterate_values(input_, input_schema.file_fields):
+        if field.name not in fields:
+            continue
 
-            elif field_schema['type'] == 'list:basic:file:':
-                files.extend(value)
+        if field.type == 'basic:file:':
+            files.append(fields[field.name])
+
+        elif field.type == 'list:basic:file:':
+            files.extend(fields[field.name])
 
     urlregex = re.compile(r'^(https?|ftp)://[-A-Za-z0-9\+&@#/%?=~_|!:,.;]*[-A-Za-z0-9\+&@#/%=~_|]')
     for value in files:
@@ -378,20 +476,23 @@ def hydrate_size(data):
 
         obj['size'] = get_dir_size(path)
 
-    for field_schema, fields in iterate_fields(data.output, data.process.output_schema):
-        name = field_schema['name']
-        value = fields[name]
-        if 'type' in field_schema:
-            if field_schema['type'].startswith('basic:file:'):
-                add_file_size(value)
-            elif field_schema['type'].startswith('list:basic:file:'):
-                for obj in value:
-                    add_file_size(obj)
-            elif field_schema['type'].startswith('basic:dir:'):
-                add_dir_size(value)
-            elif field_schema['type'].startswith('list:basic:dir:'):
-                for obj in value:
-                    add_dir_size(obj)
+    output_schema = get_compiled_schema(data.process, 'output_schema')
+    fields = output_schema.file_fields + output_schema.dir_fields
+    for field, values in output_schema.iterate_values(data.output, fields):
+        if field.name not in values:
+            continue
+
+        value = values[field.name]
+        if field.type.startswith('basic:file:'):
+            add_file_size(value)
+        elif field.type.startswith('list:basic:file:'):
+            for obj in value:
+                add_file_size(obj)
+        elif field.type.startswith('basic:dir:'):
+            add_dir_size(value)
+        elif field.type.startswith('list:basic:dir:'):
+            for obj in value:
+                add_dir_size(obj)
 
 
 def render_descriptor(data):
@@ -408,21 +509,22 @@ def render_descriptor(data):
 
     inputs = copy.deepcopy(data.input)
     if data.process.input_schema:
-        hydrate_input_references(inputs, data.process.input_schema, hydrate_values=False)
+        hydrate_input_references(inputs, get_compiled_schema(data.process, 'input_schema'), hydrate_values=False)
     template_context = inputs
 
     # Set default values
-    for field_schema, field, path in iterate_schema(data.descriptor, data.descriptor_schema.schema, 'descriptor'):
-        if 'default' in field_schema and field_schema['name'] not in field:
-            tmpl = field_schema['default']
-            if field_schema['type'].startswith('list:'):
+    descriptor_schema = get_compiled_schema(data.descriptor_schema, 'schema')
+    for field, fields in descriptor_schema.iterate_values(data.descriptor, descriptor_schema.default_fields):
+        if field.name not in fields:
+            tmpl = field.schema['default']
+            if field.type.startswith('list:'):
                 tmpl = [render_template(data.process, tmp, template_context)
                         if isinstance(tmp, six.string_types) else tmp
                         for tmp in tmpl]
             elif isinstance(tmpl, six.string_types):
                 tmpl = render_template(data.process, tmpl, template_context)
 
-            dict_dot(data, path, tmpl)
+            dict_dot(data, 'descriptor.{}'.format(field.path), tmpl)
 
 
 def render_template(process, template_string, context):
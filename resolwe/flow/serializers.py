@@ -141,8 +141,8 @@ class DataSerializer(ResolweBaseSerializer):
     process_input_schema = ProjectableJSONField(source='process.input_schema', read_only=True)
     process_output_schema = ProjectableJSONField(source='process.output_schema', read_only=True)
 
-    name = serializers.CharField(read_only=False, required=False)
-    slug = serializers.CharField(read_only=False, required=False)
+    name = serializers.CharField(read_only=False, required=False, max_length=100)
+    slug = serializers.CharField(read_only=False, required=False, max_length=100)
 
     class Meta:
         """DataSerializer Meta options."""
@@ -170,6 +170,18 @@ class DataSerializer(ResolweBaseSerializer):
 
         return fields
 
+    def validate_input(self, value):
+        """Check that input is a JSON object."""
+        if not isinstance(value, dict):
+            raise ValidationError("Input must be a dictionary.")
+        return value
+
+    def validate_descriptor(self, value):
+        """Check that descriptor is a JSON object."""
+        if not isinstance(value, dict):
+            raise ValidationError("Descriptor must be a dictionary.")
+        return value
+
 
 class CollectionSerializer(ResolweBaseSerializer):
     """Serializer for Collection objects."""
@@ -183,7 +195,9 @@ class CollectionSerializer(ResolweBaseSerializer):
 
         model = Collection
         update_protected_fields = ('contributor',)
-        read_only_fields = ('id', 'created', 'modified', 'descriptor_dirty')
+        read_only_fields = ('id', 'created', 'modified', 'descriptor_dirty', 'data_count', 'data_uploading_count',
+                            'data_resolving_count', 'data_waiting_count', 'data_processing_count', 'data_done_count',
+                            'data_error_count', 'data_dirty_count', 'latest_date')
         fields = ('slug', 'name', 'description', 'settings', 'descriptor_schema', 'descriptor',
                   'data') + update_protected_fields + read_only_fields
 
@@ -247,7 +261,7 @@ class EntitySerializer(CollectionSerializer):
 class StorageSerializer(ResolweBaseSerializer):
     """Serializer for Storage objects."""
 
-    json = ProjectableJSONField()
+    json = ProjectableJSONField(source='get_json', read_only=True)
 
     class Meta:
         """StorageSerializer Meta options."""
@@ -6,21 +6,33 @@ Signal Handlers
 
 """
 from django.db import transaction
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
 from resolwe.flow.managers import manager
-from resolwe.flow.models import Data, Entity
+from resolwe.flow.models import Collection, Data, DescriptorSchema, Entity, Process
+from resolwe.flow.utils.latest import invalidate_latest_version
+
+
+def commit_communicate():
+    """Run the manager."""
+    manager.communicate(verbosity=0)
 
 
 @receiver(post_save, sender=Data)
 def manager_post_save_handler(sender, instance, created, **kwargs):
     """Run newly created (spawned) processes."""
     if instance.status == Data.STATUS_DONE or instance.status == Data.STATUS_ERROR or created:
+        # A single manager run handles all objects saved in the same
+        # transaction, so do not schedule it more than once.
+        connection = transaction.get_connection()
+        if any(func is commit_communicate for _, func in connection.run_on_commit):
+            return
+
         # Run manager at the end of the potential transaction. Otherwise
         # tasks are send to workers before transaction ends and therefore
         # workers cannot access objects created inside transaction.
-        transaction.on_commit(lambda: manager.communicate(verbosity=0))
+        transaction.on_commit(commit_communicate)
 
 
 @receiver(pre_delete, sender=Data)
@@ -33,3 +45,71 @@ def delete_entity(sender, instance, **kwargs):
 
     if entity.data.count() == 1:  # last Data object will be just deleted
         entity.delete()
+
+
+@receiver(post_save, sender=Process)
+@receiver(post_delete, sender=Process)
+@receiver(post_save, sender=DescriptorSchema)
+@receiver(post_delete, sender=DescriptorSchema)
+def invalidate_latest_version_handler(sender, instance, **kwargs):
+    """Invalidate the cached latest version of the changed object."""
+    invalidate_latest_version(sender, instance.slug)
+
+
+@receiver(post_save, sender=Data)
+def data_aggregates_post_save(sender, instance, created, raw, **kwargs):
+    """Update aggregates of collections and entities containing saved data object.
+
+    New data objects are not in any collection or entity yet, so their
+    aggregates are updated when the data objects are added to them.
+    Status counters are moved from the status stored in the database
+    before the save, which is read while the data object is locked, so
+    concurrent saves can't move a data object out of the same status
+    twice.
+
+    """
+    if created or raw:
+        return
+
+    stored_status = instance._stored_status  # pylint: disable=protected-access
+    if stored_status is None or stored_status == instance.status:
+        return
+
+    for model in (Collection, Entity):
+        model.update_status_counts(instance.pk, stored_status, instance.status, instance.modified)
+
+
+@receiver(pre_delete, sender=Data)
+def data_aggregates_pre_delete(sender, instance, **kwargs):
+    """Remember collections and entities containing deleted data object."""
+    instance._aggregates_pks = {  # pylint: disable=protected-access
+        model: list(model.objects.filter(data=instance.pk).values_list('pk', flat=True))
+        for model in (Collection, Entity)
+    }
+
+
+@receiver(post_delete, sender=Data)
+def data_aggregates_post_delete(sender, instance, **kwargs):
+    """Update aggregates of collections and entities that contained deleted data object."""
+    for model, pks in getattr(instance, '_aggregates_pks', {}).items():
+        model.update_data_aggregates(pks=pks)
+
+
+@receiver(m2m_changed, sender=Collection.data.through)
+@receiver(m2m_changed, sender=Entity.data.through)
+def data_aggregates_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Update aggregates of collections and entities when their data change."""
+    model = Collection if sender is Collection.data.through else Entity
+
+    if reverse:
+        # Data object was added to or removed from collections or entities.
+        if action == 'pre_clear':
+            instance._aggregates_clear_pks = list(  # pylint: disable=protected-access
+                model.objects.filter(data=instance.pk).values_list('pk', flat=True)
+            )
+        elif action == 'post_clear':
+            model.update_data_aggregates(pks=getattr(instance, '_aggregates_clear_pks', []))
+        elif action in ('post_add', 'post_remove'):
+            model.update_data_aggregates(pks=pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        model.update_data_aggregates(pks=[instance.pk])
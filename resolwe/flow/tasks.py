@@ -15,3 +15,10 @@ def celery_run(data_id, script, verbosity):
     """Run process executor."""
     from .managers import manager
     manager.get_executor().run(data_id, script, verbosity)
+
+
+@shared_task
+def celery_purge(data_ids, verbosity):
+    """Delete files not referenced by finished data objects."""
+    from .utils.purge import data_purge
+    data_purge(data_ids=data_ids, delete=True, verbosity=verbosity)
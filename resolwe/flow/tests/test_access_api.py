@@ -82,7 +82,7 @@ echo "{\"collection-list\": $(curl --silent --show-error $RESOLWE_HOST_URL/colle
                 "The test process didn't obtain collection list from the live Resolwe host." +
                 self._debug_info(data)
             )
-        collection_list = Storage.objects.get(data=data).json
+        collection_list = Storage.objects.get(data=data).get_json()
         self.assertEqual(len(collection_list), 1)
         self.assertEqual(collection_list[0]['slug'], self.collection.slug)
 
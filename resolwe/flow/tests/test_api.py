@@ -1,8 +1,11 @@
 # pylint: disable=missing-docstring
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import os
+
 import mock
 
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.core.urlresolvers import reverse
 from django.db import DEFAULT_DB_ALIAS, connections
@@ -13,7 +16,8 @@ from guardian.shortcuts import assign_perm, remove_perm
 from rest_framework import exceptions, status
 from rest_framework.test import APIRequestFactory, force_authenticate
 
-from resolwe.flow.models import Collection, Data, DescriptorSchema, Entity, Process
+from resolwe.flow.models import Collection, Data, DataDependency, DescriptorSchema, Entity, Process
+from resolwe.flow.utils.stdout import StdoutWriter
 from resolwe.flow.views import CollectionViewSet, DataViewSet, EntityViewSet, ProcessViewSet
 from resolwe.test import ResolweAPITestCase, TestCase
 
@@ -69,6 +73,55 @@ class TestDataViewSetCase(TestCase):
             self.data_viewset(request)
             self.assertLess(len(captured_queries), 62)
 
+    def test_lineage(self):
+        first = Data.objects.create(contributor=self.contributor, process=self.proc)
+        second = Data.objects.create(contributor=self.contributor, process=self.proc)
+        third = Data.objects.create(contributor=self.contributor, process=self.proc)
+        DataDependency.objects.create(parent=first, child=second, kind=DataDependency.KIND_IO)
+        DataDependency.objects.create(parent=second, child=third, kind=DataDependency.KIND_IO)
+        for data in (first, second, third):
+            assign_perm('view_data', self.user, data)
+
+        descendants = DataViewSet.as_view(actions={'get': 'descendants'})
+        request = factory.get('/', '', format='json')
+        force_authenticate(request, self.user)
+        response = descendants(request, pk=first.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data], [second.pk, third.pk])
+
+        # Objects without permissions are not returned.
+        remove_perm('view_data', self.user, second)
+        ancestors = DataViewSet.as_view(actions={'get': 'ancestors'})
+        request = factory.get('/', '', format='json')
+        force_authenticate(request, self.user)
+        response = ancestors(request, pk=third.pk)
+        self.assertEqual([item['id'] for item in response.data], [first.pk])
+
+    def test_stdout(self):
+        data = Data.objects.create(contributor=self.contributor, process=self.proc)
+        data_dir = os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], str(data.pk))
+        if not os.path.isdir(data_dir):
+            os.makedirs(data_dir)
+        writer = StdoutWriter(data_dir)
+        writer.write('output\n')
+        writer.close()
+
+        stdout = DataViewSet.as_view(actions={'get': 'stdout'})
+
+        # Standard output is a file, so view permission is not enough.
+        assign_perm('view_data', self.user, data)
+        request = factory.get('/', '', format='json')
+        force_authenticate(request, self.user)
+        response = stdout(request, pk=data.pk)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        assign_perm('download_data', self.user, data)
+        request = factory.get('/', {'size': 3}, format='json')
+        force_authenticate(request, self.user)
+        response = stdout(request, pk=data.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'stdout': 'ut\n'})
+
     def test_descriptor_schema(self):
         # Descriptor schema can be assigned by slug.
         data = {'process': 'test-process', 'descriptor_schema': 'test-schema'}
@@ -126,6 +179,42 @@ class TestDataViewSetCase(TestCase):
         self.assertEqual(data.contributor.username, ANONYMOUS_USER_NAME)
         self.assertEqual(data.process.slug, 'test-process')
 
+    def test_bulk_create(self):
+        collection = Collection.objects.create(name='Test collection', contributor=self.contributor)
+        assign_perm('view_collection', self.user, collection)
+        assign_perm('add_collection', self.user, collection)
+
+        bulk_create = DataViewSet.as_view(actions={'post': 'bulk_create'})
+        data = [
+            {'process': 'test-process', 'name': 'Data {}'.format(i), 'collections': [collection.pk]}
+            for i in range(5)
+        ]
+        request = factory.post('/', data, format='json')
+        force_authenticate(request, self.user)
+        resp = bulk_create(request)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['name'] for item in resp.data], ['Data {}'.format(i) for i in range(5)])
+
+        self.assertEqual(Data.objects.count(), 5)
+        self.assertEqual(collection.data.count(), 5)
+        for data in Data.objects.all():
+            self.assertEqual(data.process, self.proc)
+            self.assertTrue(self.user.has_perm('owner_data', data))
+
+        request = factory.post('/', [{'process': 'missing-process'}], format='json')
+        force_authenticate(request, self.user)
+        resp = bulk_create(request)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Data.objects.count(), 5)
+
+        for spec in [{'input': ['not', 'a', 'dict']}, {'descriptor': 'not a dict'}, {'name': 'x' * 101}]:
+            spec['process'] = 'test-process'
+            request = factory.post('/', [{'process': 'test-process'}, spec], format='json')
+            force_authenticate(request, self.user)
+            resp = bulk_create(request)
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(Data.objects.count(), 5)
+
     def test_create_entity(self):
         collection = Collection.objects.create(name='Test collection', contributor=self.contributor)
         process = Process.objects.create(
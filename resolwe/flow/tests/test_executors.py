@@ -1,7 +1,10 @@
 # pylint: disable=missing-docstring
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import errno
 import os
+import tempfile
+import time
 import unittest
 
 import mock
@@ -13,6 +16,7 @@ from django.test import override_settings
 from guardian.shortcuts import assign_perm
 
 from resolwe.flow.executors import BaseFlowExecutor
+from resolwe.flow.executors.local import FlowExecutor as LocalFlowExecutor
 from resolwe.flow.managers import manager
 from resolwe.flow.models import Data, DataDependency, Process
 from resolwe.test import ProcessTestCase, TestCase, with_docker_executor, with_null_executor
@@ -52,6 +56,62 @@ class GetToolsTestCase(TestCase):
             base_executor.get_tools()
 
 
+class LocalExecutorTerminateTestCase(TestCase):
+
+    def test_terminate_process_group(self):
+        executor = LocalFlowExecutor(manager=None)
+        executor.data_id = 1
+        executor.start()
+        # Child ignores SIGTERM, so it has to be killed by the escalation.
+        executor.run_script("trap '' TERM; sleep 60 & wait")
+        executor.kill_delay = 0.5
+
+        start = time.time()
+        executor.terminate(1)
+        self.assertLess(time.time() - start, executor.kill_delay)
+
+        executor.end()
+        self.assertNotEqual(executor.proc.returncode, 0)
+        self.assertNotIn(1, executor.processes)
+
+        # Terminating a finished process is a no-op.
+        executor.terminate(1)
+
+    def test_terminate_orphaned_children(self):
+        pid_file = tempfile.NamedTemporaryFile()
+        self.addCleanup(pid_file.close)
+
+        executor = LocalFlowExecutor(manager=None)
+        executor.data_id = 1
+        executor.start()
+        # Group leader exits on SIGTERM, but its child ignores it.
+        executor.run_script("(trap '' TERM; sleep 60) & echo $! > {}; wait".format(pid_file.name))
+        executor.kill_delay = 0.5
+
+        deadline = time.time() + 10
+        while not os.path.getsize(pid_file.name) and time.time() < deadline:
+            time.sleep(0.05)
+        with open(pid_file.name) as handle:
+            child_pid = int(handle.read())
+
+        executor.terminate(1)
+        executor.end()
+        self.assertNotEqual(executor.proc.returncode, 0)
+
+        # Child survives the leader and is killed by the escalation.
+        os.kill(child_pid, 0)
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                os.kill(child_pid, 0)
+            except OSError as error:
+                self.assertEqual(error.errno, errno.ESRCH)
+                break
+            time.sleep(0.05)
+        else:
+            self.fail("Child process was not killed.")
+
+
 class ManagerRunProcessTest(ProcessTestCase):
     def setUp(self):
         super(ManagerRunProcessTest, self).setUp()
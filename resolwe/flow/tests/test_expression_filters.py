@@ -128,10 +128,10 @@ save-safe {{ spacy | safe }}
         self.assertEqual(data.output['list_description_text'], 'This is test Data object.')
 
         storage = Storage.objects.get(pk=data.output['description_full'])
-        self.assertEqual(storage.json, {'descriptions': {'text': 'This is test Data object.'}})
+        self.assertEqual(storage.get_json(), {'descriptions': {'text': 'This is test Data object.'}})
 
         storage = Storage.objects.get(pk=data.output['list_description_full'])
-        self.assertEqual(storage.json, {'descriptions': {'text': 'This is test Data object.'}})
+        self.assertEqual(storage.get_json(), {'descriptions': {'text': 'This is test Data object.'}})
 
 
 class ExpressionEngineTest(TestCase):
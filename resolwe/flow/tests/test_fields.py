@@ -70,6 +70,18 @@ class FieldsTest(TestCase):
         with six.assertRaisesRegex(self, DatabaseError, 'slug sequence too long'):
             TestModel.objects.create(name='Test object')
 
+    def test_sequence_base(self):
+        from .fields_test_app.models import TestModel
+
+        # Suffixes longer than the maximal sequence are part of the base.
+        TestModel.objects.create(name='Test object', slug='test-object-1234567890')
+        obj = TestModel.objects.create(name='Test object')
+        self.assertEqual(obj.slug, 'test-object')
+
+        TestModel.objects.create(name='Test object', slug='test-object-7')
+        obj = TestModel.objects.create(name='Test object')
+        self.assertEqual(obj.slug, 'test-object-8')
+
     def test_empty_name(self):
         from .fields_test_app.models import TestModel
 
@@ -79,3 +91,22 @@ class FieldsTest(TestCase):
         # Empty slugified name.
         obj = TestModel.objects.create(name='?')
         self.assertEqual(obj.slug, 'testmodel-2')
+
+    def test_allocate_slugs(self):
+        from .fields_test_app.models import TestModel
+
+        TestModel.objects.create(name='Test object')
+
+        objs = [
+            TestModel(name='Test object'),
+            TestModel(name='Test object'),
+            TestModel(name='Other object'),
+            TestModel(name='Other object', version='1.0.0'),
+        ]
+        TestModel._meta.get_field('slug').allocate_slugs(objs)  # pylint: disable=protected-access
+        TestModel.objects.bulk_create(objs)
+
+        self.assertEqual(
+            list(TestModel.objects.order_by('pk').values_list('slug', flat=True)),
+            ['test-object', 'test-object-2', 'test-object-3', 'other-object', 'other-object']
+        )
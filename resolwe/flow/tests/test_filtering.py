@@ -64,6 +64,10 @@ class DataFilterTestCase(TestCase):
         )
         cls.data_2.created = datetime.datetime(2016, 8, 30, 14, 59)
         cls.data_2.save()
+        # Descriptor is set directly, as it is not validated in this test.
+        Data.objects.filter(pk=cls.data_2.pk).update(
+            descriptor={'genome': {'build': 'hg19', 'chromosomes': 23}, 'organism': 'Homo sapiens'}
+        )
 
         cls.data_3 = Data.objects.create(
             name='Another data object',
@@ -101,6 +105,8 @@ class DataFilterTestCase(TestCase):
     def test_filter_name(self):
         self._apply_filter({'name': 'Test data 2'}, [self.data_2])
         self._apply_filter({'name__startswith': 'Test'}, [self.data_1, self.data_2])
+        self._apply_filter({'name__icontains': 'DATA 2'}, [self.data_2])
+        self._apply_filter({'name__icontains': 'data'}, [self.data_1, self.data_2, self.data_3])
 
     def test_filter_contributor(self):
         self._apply_filter({'contributor': self.user_1.pk}, [self.data_1, self.data_2])
@@ -144,6 +150,14 @@ class DataFilterTestCase(TestCase):
         self._apply_filter({'tags': 'bar'}, [self.data_2, self.data_3])
         self._apply_filter({'tags': 'bar,moo'}, [self.data_2])
 
+    def test_filter_json(self):
+        self._apply_filter({'descriptor': '{"organism": "Homo sapiens"}'}, [self.data_2])
+        self._apply_filter({'descriptor': '{"organism": "Mus musculus"}'}, [])
+        self._apply_filter({'descriptor': 'genome.build:hg19'}, [self.data_2])
+        self._apply_filter({'descriptor': 'genome.chromosomes:23'}, [self.data_2])
+        self._apply_filter({'descriptor': 'genome.chromosomes:"23"'}, [])
+        self._apply_filter({'output': 'genome.build:hg19'}, [])
+
 
 class CollectionFilterTestCase(TestCase):
 
@@ -1,12 +1,16 @@
 # pylint: disable=missing-docstring
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import datetime
 import os
 
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 
 from guardian.shortcuts import assign_perm
 
+from resolwe.flow.managers import manager
 from resolwe.flow.models import Collection, Data, DataDependency, DescriptorSchema, Process
 from resolwe.test import TransactionProcessTestCase
 
@@ -105,3 +109,91 @@ class TestManager(TransactionProcessTestCase):
         self.assertEqual(data_child1.status, Data.STATUS_DONE)
         self.assertEqual(data_child2.status, Data.STATUS_DONE)
         self.assertEqual(data_child3.status, Data.STATUS_DONE)
+
+    def test_fail_descendants(self):
+        """Test that resolving descendants of failed objects are failed at once."""
+        process = Process.objects.filter(slug='test-min').latest()
+        parent, child, grandchild, spawned = [
+            Data.objects.create(name='Test data', contributor=self.contributor, process=process)
+            for _ in range(4)
+        ]
+        DataDependency.objects.create(parent=parent, child=child, kind=DataDependency.KIND_IO)
+        DataDependency.objects.create(parent=child, child=grandchild, kind=DataDependency.KIND_IO)
+        DataDependency.objects.create(parent=parent, child=spawned, kind=DataDependency.KIND_SUBPROCESS)
+
+        Data.objects.filter(pk=parent.pk).update(status=Data.STATUS_ERROR)
+        Data.objects.filter(pk__in=[child.pk, grandchild.pk, spawned.pk]).update(status=Data.STATUS_RESOLVING)
+        collection = Collection.objects.create(name='Test collection', contributor=self.contributor)
+        collection.data.add(child, grandchild)
+
+        manager.communicate(verbosity=0)
+
+        for data in (child, grandchild):
+            data.refresh_from_db()
+            self.assertEqual(data.status, Data.STATUS_ERROR)
+            self.assertEqual(data.process_error, ["One or more inputs have status ERROR"])
+
+        # Only input dependencies are followed.
+        spawned.refresh_from_db()
+        self.assertEqual(spawned.status, Data.STATUS_DONE)
+
+        # Aggregates are updated once for all failed objects.
+        collection.refresh_from_db()
+        self.assertEqual(collection.data_resolving_count, 0)
+        self.assertEqual(collection.data_error_count, 2)
+
+    def test_reuse_cached(self):
+        """Test that results of cached processes are reused."""
+        process = Process.objects.filter(slug='test-min').latest()
+        process.persistence = Process.PERSISTENCE_CACHED
+        process.save()
+
+        first = Data.objects.create(name='Test data', contributor=self.contributor, process=process)
+        second = Data.objects.create(name='Test data', contributor=self.contributor, process=process)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, Data.STATUS_DONE)
+        self.assertEqual(second.status, Data.STATUS_DONE)
+        self.assertEqual(first.process_info, [])
+        self.assertEqual(second.process_info, ["Results reused from data object {}".format(first.pk)])
+        self.assertTrue(os.path.isfile(os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], str(second.pk), 'stdout.txt')))
+
+        # Results are not reused from data objects the user can't view.
+        other = Data.objects.create(name='Test data', contributor=self.user, process=process)
+        other.refresh_from_db()
+        self.assertEqual(other.status, Data.STATUS_DONE)
+        self.assertEqual(other.process_info, [])
+
+    def test_reap_stale(self):
+        """Test that processing objects with a stale heartbeat are handled."""
+        process = Process.objects.filter(slug='test-min').latest()
+        data = Data.objects.create(name='Test data', contributor=self.contributor, process=process)
+
+        stale = timezone.now() - datetime.timedelta(hours=1)
+        Data.objects.filter(pk=data.pk).update(status=Data.STATUS_PROCESSING, process_heartbeat=stale)
+        self.assertEqual(manager.reap(verbosity=0), 1)
+        data.refresh_from_db()
+        self.assertEqual(data.status, Data.STATUS_ERROR)
+        self.assertEqual(data.process_error, ["Executor stopped responding"])
+
+        # Objects with a recent heartbeat are left alone.
+        Data.objects.filter(pk=data.pk).update(status=Data.STATUS_PROCESSING, process_heartbeat=timezone.now())
+        self.assertEqual(manager.reap(verbosity=0), 0)
+
+        # Objects that never sent a heartbeat are reaped once they are
+        # processing for too long.
+        Data.objects.filter(pk=data.pk).update(status=Data.STATUS_PROCESSING, process_heartbeat=None,
+                                               started=timezone.now())
+        self.assertEqual(manager.reap(verbosity=0), 0)
+        Data.objects.filter(pk=data.pk).update(started=stale)
+        self.assertEqual(manager.reap(verbosity=0), 1)
+
+        Data.objects.filter(pk=data.pk).update(status=Data.STATUS_PROCESSING, process_heartbeat=stale)
+        self.assertEqual(manager.reap(requeue=True, verbosity=0), 1)
+        data.refresh_from_db()
+        self.assertEqual(data.status, Data.STATUS_RESOLVING)
+
+        manager.communicate(verbosity=0)
+        data.refresh_from_db()
+        self.assertEqual(data.status, Data.STATUS_DONE)
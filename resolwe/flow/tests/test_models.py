@@ -12,14 +12,17 @@ from mock import MagicMock, patch
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.test import override_settings
 
 from guardian.shortcuts import assign_perm, remove_perm
 from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
 
 from resolwe.flow.expression_engines import EvaluationError
 from resolwe.flow.managers import manager
-from resolwe.flow.models import Data, DataDependency, DescriptorSchema, Entity, Process, Storage
+from resolwe.flow.models import Collection, Data, DataDependency, DescriptorSchema, Entity, Process, Storage
 from resolwe.flow.models.data import hydrate_size, render_template
+from resolwe.flow.models.storage import LazyStorageJSON, StorageLoader
+from resolwe.flow.models.utils import hydrate_input_references
 from resolwe.flow.views import DataViewSet
 from resolwe.test import TestCase
 
@@ -158,6 +161,56 @@ class DataModelTest(TestCase):
 
         self.assertEqual(data.output['output_file']['size'], 7)
 
+    @patch('resolwe.flow.models.data.render_descriptor')
+    def test_dirty_fields(self, render_descriptor_mock):
+        proc = Process.objects.create(name='Test process', contributor=self.contributor)
+        descriptor_schema = DescriptorSchema.objects.create(contributor=self.contributor, schema=[
+            {'name': 'description', 'type': 'basic:string:', 'required': False},
+        ])
+        data = Data.objects.create(name='Test data', contributor=self.contributor, process=proc)
+        self.assertEqual(data.get_dirty_fields(), set())
+        self.assertEqual(render_descriptor_mock.call_count, 1)
+
+        data = Data.objects.get(pk=data.pk)
+        data.name = 'New name'
+        data.tags = ['foo']
+        self.assertEqual(data.get_dirty_fields(), set())
+        data.save()
+        self.assertEqual(render_descriptor_mock.call_count, 1)
+
+        data.descriptor_schema = descriptor_schema
+        data.descriptor = {'description': 'Test'}
+        self.assertEqual(data.get_dirty_fields(), {'descriptor', 'descriptor_schema_id'})
+        data.save()
+        self.assertEqual(render_descriptor_mock.call_count, 2)
+
+        # In-place changes are detected.
+        data.output['foo'] = 'bar'
+        self.assertEqual(data.get_dirty_fields(), {'output'})
+
+        # Deferred fields are not loaded.
+        data = Data.objects.defer('output', 'descriptor').get(pk=data.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(data.get_dirty_fields(), set())
+
+        # Only the requested fields are checked.
+        data = Data.objects.get(pk=data.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(data.get_dirty_fields(['status']), set())
+
+        # Descriptor is rendered again when inputs change.
+        data.input['foo'] = 'bar'
+        with self.assertNumQueries(0):
+            self.assertEqual(data.get_dirty_fields(), {'input'})
+        data.save()
+        self.assertEqual(render_descriptor_mock.call_count, 3)
+
+        # Only changes of updated fields are taken into account.
+        data.descriptor = {'description': 'Other'}
+        data.save(update_fields=['name'])
+        self.assertEqual(render_descriptor_mock.call_count, 3)
+        self.assertEqual(data.get_dirty_fields(), {'descriptor'})
+
     def test_dependencies_single(self):
         process = Process.objects.create(slug='test-dependencies',
                                          type='data:test:dependencies:',
@@ -240,6 +293,58 @@ class DataModelTest(TestCase):
         self.assertEqual({d.kind for d in second.parents_dependency.all()}, {DataDependency.KIND_IO})
         self.assertEqual({d.kind for d in third.parents_dependency.all()}, {DataDependency.KIND_IO})
 
+    def test_save_dependencies_bulk(self):
+        process = Process.objects.create(slug='test-dependencies-bulk',
+                                         type='data:test:dependencies:bulk:',
+                                         contributor=self.contributor,
+                                         input_schema=[{
+                                             'name': 'src',
+                                             'type': 'list:data:test:dependencies:bulk:',
+                                             'required': False,
+                                         }])
+
+        parents = [
+            Data.objects.create(name='Parent {}'.format(i), contributor=self.contributor, process=process)
+            for i in range(10)
+        ]
+        child = Data.objects.create(name='Child', contributor=self.contributor, process=process)
+        DataDependency.objects.create(parent=parents[0], child=child, kind=DataDependency.KIND_SUBPROCESS)
+
+        input_ = {'src': [parent.pk for parent in parents] + [parents[1].pk, 999999]}
+        # Select parents, update kind, select existing, bulk insert.
+        with self.assertNumQueries(4):
+            child.save_dependencies(input_, process.input_schema)
+
+        self.assertEqual(child.parents_dependency.count(), 10)
+        self.assertEqual({d.kind for d in child.parents_dependency.all()}, {DataDependency.KIND_IO})
+        self.assertEqual(set(child.parents.all()), set(parents))
+
+    def test_lineage(self):
+        process = Process.objects.create(slug='test-lineage',
+                                         type='data:test:lineage:',
+                                         contributor=self.contributor,
+                                         input_schema=[{
+                                             'name': 'src',
+                                             'type': 'list:data:test:lineage:',
+                                             'required': False,
+                                         }])
+
+        first = Data.objects.create(name='First', contributor=self.contributor, process=process)
+        second = Data.objects.create(name='Second', contributor=self.contributor, process=process,
+                                     input={'src': [first.pk]})
+        third = Data.objects.create(name='Third', contributor=self.contributor, process=process,
+                                    input={'src': [first.pk, second.pk]})
+        other = Data.objects.create(name='Other', contributor=self.contributor, process=process)
+
+        self.assertEqual(set(first.ancestors()), set())
+        self.assertEqual(set(third.ancestors()), {first, second})
+        self.assertEqual(set(first.descendants()), {second, third})
+        self.assertEqual(set(second.descendants()), {third})
+        self.assertEqual(set(other.descendants()), set())
+
+        with self.assertNumQueries(1):
+            list(first.descendants())
+
 
 class EntityModelTest(TestCase):
 
@@ -266,6 +371,93 @@ class EntityModelTest(TestCase):
         # Make sure tags are copied.
         self.assertEqual(entity.tags, data.tags)
 
+    def test_data_aggregates(self):
+        entity = self.data.entity_set.get()
+        collection = Collection.objects.create(name='Test collection', contributor=self.contributor)
+        collection.data.add(self.data)
+
+        for obj in (collection, entity):
+            obj.refresh_from_db()
+            self.assertEqual(obj.data_count, 1)
+            self.assertEqual(obj.data_resolving_count, 1)
+            self.assertEqual(obj.data_error_count, 0)
+            self.assertEqual(obj.latest_date, self.data.modified)
+
+        self.data.status = Data.STATUS_ERROR
+        self.data.save()
+        for obj in (collection, entity):
+            obj.refresh_from_db()
+            self.assertEqual(obj.data_count, 1)
+            self.assertEqual(obj.data_resolving_count, 0)
+            self.assertEqual(obj.data_error_count, 1)
+            self.assertEqual(obj.latest_date, self.data.modified)
+
+        # Saves that don't change the status don't touch aggregates.
+        latest_date = self.data.modified
+        self.data.name = 'Renamed data'
+        with patch.object(Collection, 'update_status_counts') as update_status_counts, \
+                patch.object(Collection, 'update_data_aggregates') as update_data_aggregates:
+            self.data.save()
+        self.assertFalse(update_status_counts.called)
+        self.assertFalse(update_data_aggregates.called)
+        collection.refresh_from_db()
+        self.assertEqual(collection.latest_date, latest_date)
+
+        # Counters are moved from the stored status, also when objects
+        # were loaded before the status was changed by another save.
+        first = Data.objects.get(pk=self.data.pk)
+        second = Data.objects.get(pk=self.data.pk)
+        stale = Data.objects.get(pk=self.data.pk)
+        first.status = Data.STATUS_DONE
+        first.save()
+        second.status = Data.STATUS_DONE
+        second.save()
+        collection.refresh_from_db()
+        self.assertEqual(collection.data_error_count, 0)
+        self.assertEqual(collection.data_done_count, 1)
+
+        first.status = Data.STATUS_PROCESSING
+        first.save()
+        stale.save()
+        for obj in (collection, entity):
+            obj.refresh_from_db()
+            self.assertEqual(obj.data_processing_count, 0)
+            self.assertEqual(obj.data_error_count, 1)
+            self.assertEqual(obj.data_done_count, 0)
+
+        stale.status = Data.STATUS_DONE
+        stale.save()
+        collection.refresh_from_db()
+        self.assertEqual(collection.data_error_count, 0)
+        self.assertEqual(collection.data_done_count, 1)
+
+        collection.data.remove(self.data)
+        collection.refresh_from_db()
+        self.assertEqual(collection.data_count, 0)
+        self.assertEqual(collection.data_done_count, 0)
+        self.assertIsNone(collection.latest_date)
+
+    def test_bulk_create_entities(self):
+        process = Process.objects.create(name='Plain process', contributor=self.contributor)
+        data = [
+            Data.objects.create(name='Data {}'.format(i), contributor=self.contributor, process=process)
+            for i in range(3)
+        ]
+        DataDependency.objects.create(parent=self.data, child=data[0], kind=DataDependency.KIND_IO)
+        Data.objects.filter(process=process).update(process=self.process)
+        data = list(Data.objects.filter(process=self.process).exclude(pk=self.data.pk).order_by('pk'))
+
+        Data.bulk_create_entities(data)
+
+        # Child of data in an entity joins it.
+        self.assertEqual(Entity.objects.count(), 3)
+        self.assertEqual(self.data.entity_set.get(), data[0].entity_set.get())
+        for obj in data[1:]:
+            entity = obj.entity_set.get()
+            self.assertEqual(entity.name, obj.name)
+            self.assertEqual(entity.descriptor_schema.slug, 'sample')
+            self.assertTrue(self.contributor.has_perm('flow.edit_entity', entity))
+
 
 class GetOrCreateTestCase(APITestCase):
 
@@ -519,7 +711,7 @@ class StorageModelTestCase(TestCase):
         self.assertEqual(Storage.objects.count(), 1)
         storage = Storage.objects.first()
         self.assertEqual(data.output['json_field'], storage.pk)
-        self.assertEqual(storage.json, {'foo': 'bar'})
+        self.assertEqual(storage.get_json(), {'foo': 'bar'})
 
     def test_delete_data(self):
         """`Storage` is deleted when `Data` object is deleted"""
@@ -538,6 +730,97 @@ class StorageModelTestCase(TestCase):
         data.delete()
         self.assertEqual(Storage.objects.count(), 0)
 
+    def test_external_storage(self):
+        data = Data.objects.create(
+            name='Test data',
+            contributor=self.contributor,
+            process=self.proc,
+        )
+        table = {
+            'columns': ['gene', 'expression'],
+            'rows': [['gene_{}'.format(i), i] for i in range(5)],
+        }
+
+        with override_settings(FLOW_STORAGE={'EXTERNAL_THRESHOLD': 10, 'CHUNK_SIZE': 2}):
+            storage = Storage.objects.create(contributor=self.contributor, data=data, json=table)
+            rows = Storage.objects.create(contributor=self.contributor, data=data, json=table['rows'])
+            small = Storage.objects.create(contributor=self.contributor, data=data, json={'a': 1})
+
+        storage.refresh_from_db()
+        self.assertIsNone(storage.json)
+        self.assertTrue(os.path.isfile(os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], storage.json_file)))
+        self.assertEqual(storage.get_json(), table)
+        self.assertEqual(storage.read_json(path=['columns']), ['gene', 'expression'])
+        self.assertEqual(storage.read_json(path=['rows', '3', '0']), 'gene_3')
+        self.assertEqual(storage.read_json(path=['rows'], start=1, stop=3, columns=['1']), [[1], [2]])
+        with self.assertRaises(KeyError):
+            storage.read_json(path=['missing'])
+
+        self.assertEqual(rows.get_json(), table['rows'])
+        self.assertEqual(rows.read_json(start=1, stop=4), table['rows'][1:4])
+        self.assertEqual(rows.read_json(path=['4', '1']), 4)
+
+        # Small JSON is stored in the database.
+        self.assertIsNone(small.json_file)
+        self.assertEqual(small.get_json(), {'a': 1})
+
+        # Only the requested part is read from the database.
+        inline = Storage.objects.create(contributor=self.contributor, data=data, json=table)
+        inline = Storage.objects.defer('json').get(pk=inline.pk)
+        self.assertEqual(inline.read_json(path=['rows', '2'], columns=None), ['gene_2', 2])
+        self.assertEqual(inline.read_json(path=['rows'], start=0, stop=1), [['gene_0', 0]])
+        with self.assertRaises(KeyError):
+            inline.read_json(path=['missing'])
+
+        # The previous file is removed when JSON is changed, also if
+        # external storage is not configured anymore.
+        previous_path = os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], storage.json_file)
+        storage.json = {'a': 2}
+        with patch('resolwe.flow.models.storage.transaction.on_commit', lambda func: func()):
+            storage.save()
+        self.assertIsNone(storage.json_file)
+        self.assertFalse(os.path.isfile(previous_path))
+        storage.refresh_from_db()
+        self.assertIsNone(storage.json_file)
+        self.assertIsNone(storage.json_size)
+        self.assertEqual(storage.get_json(), {'a': 2})
+
+    def test_storage_loader(self):
+        data = Data.objects.create(
+            name='Test data',
+            contributor=self.contributor,
+            process=self.proc,
+        )
+        storages = [
+            Storage.objects.create(contributor=self.contributor, data=data, json={'value': i})
+            for i in range(3)
+        ]
+
+        loader = StorageLoader()
+        lazy_storages = [LazyStorageJSON(loader=loader, pk=storage.pk) for storage in storages]
+
+        # Sizes and then all registered storages are loaded with a
+        # single query each.
+        with self.assertNumQueries(2):
+            self.assertEqual([lazy['value'] for lazy in lazy_storages], [0, 1, 2])
+
+        with self.assertRaises(Storage.DoesNotExist):
+            loader.get(storages[-1].pk + 1)
+
+        # Only storages that fit in a small cache are loaded together.
+        size = len(json.dumps({'value': 0}))
+        loader = StorageLoader(max_size=2 * size)
+        lazy_storages = [LazyStorageJSON(loader=loader, pk=storage.pk) for storage in storages]
+        with self.assertNumQueries(2):
+            self.assertEqual(lazy_storages[0]['value'], 0)
+            self.assertEqual(lazy_storages[1]['value'], 1)
+        self.assertEqual(list(loader._cache), [storages[0].pk, storages[1].pk])  # pylint: disable=protected-access
+
+        # Least recently used storage is evicted before the next batch.
+        with self.assertNumQueries(1):
+            self.assertEqual(lazy_storages[2]['value'], 2)
+        self.assertEqual(list(loader._cache), [storages[1].pk, storages[2].pk])  # pylint: disable=protected-access
+
 
 class UtilsTestCase(TestCase):
 
@@ -550,3 +833,38 @@ class UtilsTestCase(TestCase):
         process_mock = MagicMock(requirements={'expression-engine': 'jinja'})
         with self.assertRaises(EvaluationError):
             render_template(process_mock, '{{ 1 | missing_increase }}', {})
+
+    def test_hydrate_input_references(self):
+        contributor = get_user_model().objects.create(username='test_user')
+        output_process = Process.objects.create(
+            contributor=contributor,
+            type='data:test:',
+            output_schema=[{'name': 'result', 'type': 'basic:file:'}],
+        )
+        # Output files are not checked for data objects with errors.
+        data_1 = Data.objects.create(contributor=contributor, process=output_process, status=Data.STATUS_ERROR,
+                                     output={'result': {'file': 'result.txt'}})
+        data_2 = Data.objects.create(contributor=contributor, process=output_process, status=Data.STATUS_ERROR,
+                                     output={'result': {'file': 'result.txt'}})
+
+        input_schema = [
+            {'name': 'single', 'type': 'data:test:'},
+            {'name': 'multiple', 'type': 'list:data:test:'},
+        ]
+        inputs = {'single': data_1.pk, 'multiple': [data_1.pk, data_2.pk]}
+
+        # All referenced objects are fetched with a single query.
+        with self.assertNumQueries(1):
+            hydrate_input_references(inputs, input_schema)
+
+        self.assertEqual(inputs['single']['__id'], data_1.pk)
+        self.assertEqual(inputs['single']['__type'], 'data:test:')
+        self.assertEqual(inputs['single']['result']['file'],
+                         os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], str(data_1.pk), 'result.txt'))
+        self.assertEqual([output['__id'] for output in inputs['multiple']], [data_1.pk, data_2.pk])
+        self.assertEqual(inputs['multiple'][1]['result']['file'],
+                         os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], str(data_2.pk), 'result.txt'))
+
+        # Stored outputs are not changed.
+        data_1.refresh_from_db()
+        self.assertEqual(data_1.output, {'result': {'file': 'result.txt'}})
@@ -247,7 +247,7 @@ re-save-dir-list sample_dir_list dir1:ref2 dir2 dir3
                 )
 
                 self.assertEqual(len(log.records), 1)
-                self.assertEqual(log.records[0].name, 'resolwe.flow.executors')
+                self.assertEqual(log.records[0].name, 'resolwe.flow.managers.base')
                 self.assertTrue(str(log.records[0].msg).startswith('Purge error:'))
                 self.assertTrue('TestPurgeException' in str(log.records[0].msg))
 
@@ -72,7 +72,7 @@ class TestingFrameworkTestCase(TestCase):
 
         storage_mock = mock.MagicMock(spec=Storage)
         storage_mock.id = 'no_id'
-        storage_mock.json = example_json
+        storage_mock.get_json.return_value = example_json
 
         # use in-memory binary stream object for speed and simplicity
         gzipped_json_file = io.BytesIO()
@@ -102,7 +102,7 @@ class TestingFrameworkTestCase(TestCase):
         storage_id = 'no_id'
         storage_mock = mock.MagicMock(spec=Storage)
         storage_mock.id = storage_id
-        storage_mock.json = example_json
+        storage_mock.get_json.return_value = example_json
         get_mock.side_effect = [storage_mock]
 
         # use in-memory binary stream object for speed and simplicity
@@ -131,7 +131,7 @@ class TestingFrameworkTestCase(TestCase):
 
         storage_mock = mock.MagicMock(spec=Storage)
         storage_mock.id = 'no_id'
-        storage_mock.json = example_json
+        storage_mock.get_json.return_value = example_json
 
         # use in-memory binary stream object for speed and simplicity
         gzipped_json_file = io.BytesIO()
@@ -1,15 +1,21 @@
 # pylint: disable=missing-docstring
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import os
+
 from mock import patch
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
 from rest_framework.response import Response
 
 from resolwe.flow.models import Data, Process
-from resolwe.flow.utils import get_data_checksum
+from resolwe.flow.utils import get_data_checksum, get_file_checksum, iterate_fields
 from resolwe.flow.utils.exceptions import resolwe_exception_handler
+from resolwe.flow.utils.latest import get_latest_version
+from resolwe.flow.utils.schema import compile_schema, get_compiled_schema
+from resolwe.flow.utils.stdout import StdoutWriter, read_stdout_tail
 from resolwe.test import TestCase
 
 
@@ -44,3 +50,175 @@ class ExceptionsTestCase(TestCase):
         data.input = {'genome': 'HG19', 'tss': 0}
         checksum = get_data_checksum(data.input, process.slug, process.version)
         self.assertEqual(checksum, 'ca322c2bb48b58eea3946e624fe6cfdc53c2cc12478465b6f0ca2d722e280c4c')
+
+    def test_canonical_checksum(self):
+        input_schema = [
+            {'name': 'reads', 'type': 'basic:file:'},
+            {'name': 'tss', 'type': 'basic:integer:', 'default': 0},
+        ]
+        upload_dir = settings.FLOW_EXECUTOR['UPLOAD_DIR']
+        for file_temp in ('upload-1', 'upload-2'):
+            with open(os.path.join(upload_dir, file_temp), 'w') as handle:
+                handle.write('ACGT')
+
+        first = get_data_checksum(
+            {'reads': {'file': 'reads.fq', 'file_temp': 'upload-1'}}, 'my-process', '1.0.0', input_schema)
+        second = get_data_checksum(
+            {'reads': {'file': 'reads.fq', 'file_temp': 'upload-2'}, 'tss': 0}, 'my-process', '1.0.0', input_schema)
+        self.assertEqual(first, second)
+
+        with open(os.path.join(upload_dir, 'upload-4'), 'w') as handle:
+            handle.write('TGCA')
+        second = get_data_checksum(
+            {'reads': {'file': 'reads.fq', 'file_temp': 'upload-4'}}, 'my-process', '1.0.0', input_schema)
+        self.assertNotEqual(first, second)
+
+        # Checksums given in inputs are ignored.
+        checksum = get_file_checksum(os.path.join(upload_dir, 'upload-1'))
+        forged = get_data_checksum(
+            {'reads': {'file': 'reads.fq', 'file_temp': 'upload-4', 'file_checksum': checksum}},
+            'my-process', '1.0.0', input_schema
+        )
+        self.assertEqual(forged, second)
+
+        # Uploaded files are only read once.
+        with patch('resolwe.flow.utils.get_file_checksum', wraps=get_file_checksum) as checksum_mock:
+            for _ in range(2):
+                get_data_checksum(
+                    {'reads': {'file': 'reads.fq', 'file_temp': 'upload-4'}}, 'my-process', '1.0.0', input_schema)
+            self.assertEqual(checksum_mock.call_count, 0)
+
+            with open(os.path.join(upload_dir, 'upload-3'), 'w') as handle:
+                handle.write('ACGT')
+            for _ in range(2):
+                third = get_data_checksum(
+                    {'reads': {'file': 'reads.fq', 'file_temp': 'upload-3'}}, 'my-process', '1.0.0', input_schema)
+            self.assertEqual(checksum_mock.call_count, 1)
+        self.assertEqual(first, third)
+
+
+class StdoutTestCase(TestCase):
+
+    def setUp(self):
+        super(StdoutTestCase, self).setUp()
+
+        self.data_dir = os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], '1')
+        os.makedirs(self.data_dir)
+
+    def test_write_and_read(self):
+        writer = StdoutWriter(self.data_dir)
+        writer.write('first line\n')
+        writer.write('second line\n')
+        writer.close()
+
+        self.assertEqual(read_stdout_tail(1), 'first line\nsecond line\n')
+        self.assertEqual(read_stdout_tail(1, size=5), 'line\n')
+        self.assertEqual(read_stdout_tail(2), None)
+
+    def test_truncate(self):
+        writer = StdoutWriter(self.data_dir, compress=True, max_size=20, tail_size=10)
+        for i in range(10):
+            writer.write('line {}\n'.format(i))
+        writer.close()
+
+        self.assertEqual(
+            read_stdout_tail(1),
+            'line 0\n\n[... 56 bytes of output omitted ...]\nline 9\n'
+        )
+
+    def test_read_unfinished_compressed(self):
+        writer = StdoutWriter(self.data_dir, compress=True)
+        for i in range(1000):
+            writer.write('line {}\n'.format(i))
+        writer.close()
+
+        # Output of a running or crashed process has no end-of-stream marker.
+        with open(writer.path, 'rb+') as handle:
+            handle.seek(-8, os.SEEK_END)
+            handle.truncate()
+
+        self.assertEqual(read_stdout_tail(1, size=9), 'line 999\n')
+
+    def test_read_size_limit(self):
+        writer = StdoutWriter(self.data_dir)
+        writer.write('line\n')
+        writer.close()
+
+        with patch('resolwe.flow.utils.stdout.MAX_TAIL_SIZE', 3):
+            self.assertEqual(read_stdout_tail(1, size=100), 'ne\n')
+
+
+class CompiledSchemaTestCase(TestCase):
+
+    def setUp(self):
+        super(CompiledSchemaTestCase, self).setUp()
+
+        self.schema = [
+            {'name': 'reads', 'type': 'data:reads:'},
+            {'name': 'options', 'group': [
+                {'name': 'count', 'type': 'basic:integer:', 'default': 3},
+                {'name': 'annotation', 'type': 'list:basic:file:'},
+            ]},
+            {'name': 'report', 'type': 'basic:json:'},
+        ]
+
+    def test_compile(self):
+        schema = compile_schema(self.schema)
+
+        self.assertEqual(
+            [field.path for field in schema.fields],
+            ['reads', 'options.count', 'options.annotation', 'report']
+        )
+        self.assertEqual([field.path for field in schema.data_fields], ['reads'])
+        self.assertEqual([field.path for field in schema.file_fields], ['options.annotation'])
+        self.assertEqual([field.path for field in schema.json_fields], ['report'])
+        self.assertEqual([field.path for field in schema.dir_fields], [])
+        self.assertEqual([field.path for field in schema.default_fields], ['options.count'])
+
+        values = {'reads': 1, 'options': {'count': 5}}
+        self.assertEqual(
+            [(field.name, fields) for field, fields in schema.iterate_values(values, schema.default_fields)],
+            [('count', {'count': 5})]
+        )
+        self.assertEqual(
+            [(field_schema['name'], fields) for field_schema, fields in schema.iterate_fields(values)],
+            [(field_schema['name'], fields) for field_schema, fields in iterate_fields(values, self.schema)]
+        )
+
+        with self.assertRaises(KeyError):
+            list(schema.iterate_fields({'unknown': 1}))
+
+    def test_cache(self):
+        process = Process.objects.create(contributor=self.contributor, input_schema=self.schema)
+
+        schema = get_compiled_schema(process, 'input_schema')
+        self.assertIs(get_compiled_schema(process, 'input_schema'), schema)
+
+        # Compiled schema is not changed with the process' schema.
+        process.input_schema[0]['type'] = 'data:genome:'
+        self.assertEqual(schema.data_fields[0].type, 'data:reads:')
+
+        # Changes are noticed once the process is saved.
+        process.save()
+        schema = get_compiled_schema(process, 'input_schema')
+        self.assertEqual(schema.data_fields[0].type, 'data:genome:')
+
+
+class LatestVersionTestCase(TestCase):
+
+    def test_get_latest_version(self):
+        Process.objects.create(slug='test-latest', version='1.0.0', contributor=self.contributor)
+        self.assertEqual(str(get_latest_version(Process, 'test-latest').version), '1.0.0')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(str(get_latest_version(Process, 'test-latest').version), '1.0.0')
+
+        # Saving a new version invalidates the cache.
+        process = Process.objects.create(slug='test-latest', version='2.0.0', contributor=self.contributor)
+        self.assertEqual(str(get_latest_version(Process, 'test-latest').version), '2.0.0')
+
+        process.delete()
+        self.assertEqual(str(get_latest_version(Process, 'test-latest').version), '1.0.0')
+
+        with self.assertRaises(Process.DoesNotExist):
+            get_latest_version(Process, 'test-missing')
@@ -1,6 +1,11 @@
 # pylint: disable=missing-docstring
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import os
+import time
+import unittest
+
+import jsonschema
 import six
 from mock import MagicMock, patch
 
@@ -8,7 +13,8 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 
 from resolwe.flow.models import Collection, Data, DescriptorSchema, Entity, Process, Storage
-from resolwe.flow.models.utils import validate_schema
+from resolwe.flow.models.utils import TYPE_SCHEMA, validate_schema
+from resolwe.flow.utils import iterate_fields
 from resolwe.test import TestCase
 
 
@@ -528,61 +534,37 @@ class ValidationUnitTest(TestCase):
         }
 
         with patch('resolwe.flow.models.data.Data') as data_mock:
-            value_mock = MagicMock(**{
-                'exists.return_value': True,
-                'first.return_value': {'process__type': 'data:test:upload:'},
-            })
-            filter_mock = MagicMock(**{'values.return_value': value_mock})
-            data_mock.objects.filter.return_value = filter_mock
+            data_mock.objects.filter.return_value.values_list.return_value = [(1, 'data:test:upload:')]
 
             validate_schema(instance, schema)
 
-            self.assertEqual(value_mock.exists.call_count, 1)
-            self.assertEqual(value_mock.first.call_count, 1)
+            self.assertEqual(data_mock.objects.filter.call_count, 1)
 
         # subtype is OK
         with patch('resolwe.flow.models.data.Data') as data_mock:
-            value_mock = MagicMock(**{
-                'exists.return_value': True,
-                'first.return_value': {'process__type': 'data:test:upload:subtype:'},
-            })
-            filter_mock = MagicMock(**{'values.return_value': value_mock})
-            data_mock.objects.filter.return_value = filter_mock
+            data_mock.objects.filter.return_value.values_list.return_value = [(1, 'data:test:upload:subtype:')]
 
             validate_schema(instance, schema)
 
-            self.assertEqual(value_mock.exists.call_count, 1)
-            self.assertEqual(value_mock.first.call_count, 1)
+            self.assertEqual(data_mock.objects.filter.call_count, 1)
 
         # missing `Data` object
         with patch('resolwe.flow.models.data.Data') as data_mock:
-            value_mock = MagicMock(**{
-                'exists.return_value': False,
-                'first.return_value': {'process__type': 'data:test:upload:'},
-            })
-            filter_mock = MagicMock(**{'values.return_value': value_mock})
-            data_mock.objects.filter.return_value = filter_mock
+            data_mock.objects.filter.return_value.values_list.return_value = []
 
             with six.assertRaisesRegex(self, ValidationError, '`Data` object does not exist'):
                 validate_schema(instance, schema)
 
-            self.assertEqual(value_mock.exists.call_count, 1)
-            self.assertEqual(value_mock.first.call_count, 0)
+            self.assertEqual(data_mock.objects.filter.call_count, 1)
 
         # `Data` object of wrong type
         with patch('resolwe.flow.models.data.Data') as data_mock:
-            value_mock = MagicMock(**{
-                'exists.return_value': True,
-                'first.return_value': {'process__type': 'data:test:wrong:'},
-            })
-            filter_mock = MagicMock(**{'values.return_value': value_mock})
-            data_mock.objects.filter.return_value = filter_mock
+            data_mock.objects.filter.return_value.values_list.return_value = [(1, 'data:test:wrong:')]
 
             with six.assertRaisesRegex(self, ValidationError, 'Data object of type .* is required'):
                 validate_schema(instance, schema)
 
-            self.assertEqual(value_mock.exists.call_count, 1)
-            self.assertEqual(value_mock.first.call_count, 1)
+            self.assertEqual(data_mock.objects.filter.call_count, 1)
 
         # data `id` shouldn't be string
         instance = {
@@ -720,26 +702,22 @@ class ValidationUnitTest(TestCase):
             validate_schema(instance, schema)
 
         with patch('resolwe.flow.models.utils.Storage') as storage_mock:
-            filter_mock = MagicMock()
-            filter_mock.exists.return_value = True
-            storage_mock.objects.filter.return_value = filter_mock
+            storage_mock.objects.filter.return_value.values_list.return_value = [5]
 
             instance = {'big_dict': 5}
             validate_schema(instance, schema)
 
-            self.assertEqual(filter_mock.exists.call_count, 1)
+            self.assertEqual(storage_mock.objects.filter.call_count, 1)
 
         # non existing `Storage`
         with patch('resolwe.flow.models.utils.Storage') as storage_mock:
-            filter_mock = MagicMock()
-            filter_mock.exists.return_value = False
-            storage_mock.objects.filter.return_value = filter_mock
+            storage_mock.objects.filter.return_value.values_list.return_value = []
 
             instance = {'big_dict': 5}
             with six.assertRaisesRegex(self, ValidationError, '`Storage` object does not exist'):
                 validate_schema(instance, schema)
 
-            self.assertEqual(filter_mock.exists.call_count, 1)
+            self.assertEqual(storage_mock.objects.filter.call_count, 1)
 
     def test_list_string_field(self):
         schema = [
@@ -789,69 +767,53 @@ class ValidationUnitTest(TestCase):
         }
 
         with patch('resolwe.flow.models.data.Data') as data_mock:
-            value_mock = MagicMock(**{
-                'exists.return_value': True,
-                'first.return_value': {'process__type': 'data:test:upload:'},
-            })
-            filter_mock = MagicMock(**{'values.return_value': value_mock})
-            data_mock.objects.filter.return_value = filter_mock
+            data_mock.objects.filter.return_value.values_list.return_value = [
+                (1, 'data:test:upload:'),
+                (3, 'data:test:upload:'),
+                (4, 'data:test:upload:'),
+            ]
 
             validate_schema(instance, schema)
 
-            self.assertEqual(value_mock.exists.call_count, 3)
-            self.assertEqual(value_mock.first.call_count, 3)
+            # All objects are checked with a single query.
+            self.assertEqual(data_mock.objects.filter.call_count, 1)
 
         # subtypes are OK
         with patch('resolwe.flow.models.data.Data') as data_mock:
-            value_mock = MagicMock(**{
-                'exists.return_value': True,
-                'first.side_effect': [
-                    {'process__type': 'data:test:upload:subtype1:'},
-                    {'process__type': 'data:test:upload:'},
-                    {'process__type': 'data:test:upload:subtype2:'},
-                ],
-            })
-            filter_mock = MagicMock(**{'values.return_value': value_mock})
-            data_mock.objects.filter.return_value = filter_mock
+            data_mock.objects.filter.return_value.values_list.return_value = [
+                (1, 'data:test:upload:subtype1:'),
+                (3, 'data:test:upload:'),
+                (4, 'data:test:upload:subtype2:'),
+            ]
 
             validate_schema(instance, schema)
 
-            self.assertEqual(value_mock.exists.call_count, 3)
-            self.assertEqual(value_mock.first.call_count, 3)
+            self.assertEqual(data_mock.objects.filter.call_count, 1)
 
         # one object does not exist
         with patch('resolwe.flow.models.data.Data') as data_mock:
-            value_mock = MagicMock(**{
-                'exists.side_effect': [True, False, True],
-                'first.return_value': {'process__type': 'data:test:upload:'},
-            })
-            filter_mock = MagicMock(**{'values.return_value': value_mock})
-            data_mock.objects.filter.return_value = filter_mock
+            data_mock.objects.filter.return_value.values_list.return_value = [
+                (1, 'data:test:upload:'),
+                (4, 'data:test:upload:'),
+            ]
 
-            with six.assertRaisesRegex(self, ValidationError, '`Data` object does not exist'):
+            with six.assertRaisesRegex(self, ValidationError, r'`Data` object does not exist \(id:3\)'):
                 validate_schema(instance, schema)
 
-            self.assertEqual(value_mock.exists.call_count, 2)
-            self.assertEqual(value_mock.first.call_count, 1)
+            self.assertEqual(data_mock.objects.filter.call_count, 1)
 
         # one object of wrong type
         with patch('resolwe.flow.models.data.Data') as data_mock:
-            value_mock = MagicMock(**{
-                'exists.return_value': True,
-                'first.side_effect': [
-                    {'process__type': 'data:test:upload:'},
-                    {'process__type': 'data:test:upload:'},
-                    {'process__type': 'data:test:wrong:'},
-                ],
-            })
-            filter_mock = MagicMock(**{'values.return_value': value_mock})
-            data_mock.objects.filter.return_value = filter_mock
+            data_mock.objects.filter.return_value.values_list.return_value = [
+                (1, 'data:test:upload:'),
+                (3, 'data:test:upload:'),
+                (4, 'data:test:wrong:'),
+            ]
 
             with six.assertRaisesRegex(self, ValidationError, 'Data object of type .* is required'):
                 validate_schema(instance, schema)
 
-            self.assertEqual(value_mock.exists.call_count, 3)
-            self.assertEqual(value_mock.first.call_count, 3)
+            self.assertEqual(data_mock.objects.filter.call_count, 1)
 
     def test_list_file_field(self):
         schema = [
@@ -940,3 +902,72 @@ class ValidationUnitTest(TestCase):
         }}
         with six.assertRaisesRegex(self, ValidationError, '"description" not given'):
             validate_schema(instance, schema)
+
+
+@unittest.skipUnless(os.environ.get('RESOLWE_BENCHMARK'), "Set RESOLWE_BENCHMARK to run benchmarks")
+class ValidationBenchmark(TestCase):
+
+    def setUp(self):
+        super(ValidationBenchmark, self).setUp()
+
+        fields = [
+            ('basic:string:', 'Test string'),
+            ('basic:integer:', 42),
+            ('basic:decimal:', 4.2),
+            ('basic:boolean:', True),
+            ('basic:date:', '2017-10-01'),
+            ('basic:url:link:', {'url': 'http://genialis.com', 'name': 'Genialis'}),
+            ('list:basic:string:', ['a', 'b', 'c']),
+            ('list:basic:integer:', [1, 2, 3]),
+        ]
+
+        self.schema = []
+        self.instance = {}
+        for i in range(500):
+            type_, value = fields[i % len(fields)]
+            name = 'field_{}'.format(i)
+            self.schema.append({'name': name, 'type': type_})
+            self.instance[name] = value
+
+    def test_validate_schema(self):
+        repeats = 10
+
+        start = time.time()
+        for _ in range(repeats):
+            for field_schema, fields in iterate_fields(self.instance, self.schema):
+                value = fields[field_schema['name']]
+                jsonschema.validate([{'type': field_schema['type'], 'value': value}], TYPE_SCHEMA)
+        uncompiled = time.time() - start
+
+        start = time.time()
+        for _ in range(repeats):
+            validate_schema(self.instance, self.schema)
+        compiled = time.time() - start
+
+        self.assertLess(compiled, uncompiled, "Validating {} fields: {:.3f}s with per-field schema validation, "
+                        "{:.3f}s with compiled validators".format(len(self.schema), uncompiled / repeats,
+                                                                   compiled / repeats))
+
+    def test_data_save(self):
+        process = Process.objects.create(
+            contributor=self.contributor,
+            input_schema=self.schema,
+            output_schema=self.schema,
+        )
+        data = Data.objects.create(contributor=self.contributor, process=process, input=self.instance)
+        data.output = dict(self.instance)
+        data.status = Data.STATUS_DONE
+
+        repeats = 10
+        with patch('resolwe.flow.models.data.validate_schema', wraps=validate_schema) as validate:
+            start = time.time()
+            for i in range(repeats):
+                # Unchanged data objects are not validated again.
+                data.output['field_0'] = 'Test string {}'.format(i)
+                data.save()
+            elapsed = (time.time() - start) / repeats
+
+        # Output is validated on each save.
+        self.assertEqual(validate.call_count, repeats)
+        self.assertLess(elapsed, 1, "Saving data object with {} input and output fields: {:.3f}s".format(
+            len(self.schema), elapsed))
@@ -7,23 +7,152 @@ Flow Utilities
 .. automodule:: resolwe.flow.utils.purge
    :members:
 
+.. automodule:: resolwe.flow.utils.schema
+   :members:
+
+.. automodule:: resolwe.flow.utils.latest
+   :members:
+
+.. automodule:: resolwe.flow.utils.stdout
+   :members:
+
 .. automodule:: resolwe.flow.utils.exceptions
    :members:
 
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import collections
+import copy
 import functools
 import hashlib
 import json
+import os
+import threading
+
+import six
 
+from django.conf import settings
 from django.db import models
 
 from .iterators import iterate_fields, iterate_schema  # pylint: disable=unused-import
+from .schema import compile_schema
+
+#: size of chunks in which files are read when computing checksums
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+#: maximal number of checksums of uploaded files kept in the cache
+CHECKSUM_CACHE_SIZE = 1024
+
+_checksum_cache = collections.OrderedDict()  # pylint: disable=invalid-name
+_checksum_cache_lock = threading.Lock()  # pylint: disable=invalid-name
+
+
+def get_file_checksum(path):
+    """Return SHA256 checksum of file's content."""
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(functools.partial(handle.read, CHECKSUM_CHUNK_SIZE), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def get_upload_checksum(path):
+    """Return SHA256 checksum of uploaded file's content.
+
+    The file is hashed in chunks once and the checksum is cached by the
+    file's path, size and modification time, e.g. for checking for
+    existing results and creating the data object afterwards. Uploaded
+    files have unique names and are not changed after the upload.
+
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
+    with _checksum_cache_lock:
+        checksum = _checksum_cache.pop(key, None)
+        if checksum is not None:
+            # Re-insert the checksum to mark it as recently used.
+            _checksum_cache[key] = checksum
+            return checksum
+
+    checksum = get_file_checksum(path)
+    with _checksum_cache_lock:
+        _checksum_cache[key] = checksum
+        while len(_checksum_cache) > CHECKSUM_CACHE_SIZE:
+            _checksum_cache.popitem(last=False)
+
+    return checksum
+
+
+def _canonical_file(value):
+    """Replace the location of an uploaded file with its checksum.
+
+    The checksum is always computed on the server from the content of
+    the uploaded file (see :func:`get_upload_checksum`), checksums
+    given in inputs are ignored. Files that do not exist (e.g. URLs)
+    are identified by their location.
+
+    """
+    if not isinstance(value, dict) or not isinstance(value.get('file_temp'), six.string_types):
+        return value
+
+    value = dict(value)
+    value.pop('file_checksum', None)
+
+    path = value['file_temp']
+    if not os.path.isabs(path):
+        path = os.path.join(settings.FLOW_EXECUTOR['UPLOAD_DIR'], path)
+    if not os.path.isfile(path):
+        return value
+
+    del value['file_temp']
+    value['file_checksum'] = get_upload_checksum(path)
+    return value
+
+
+def canonicalize_input(proc_input, input_schema):
+    """Return canonical representation of process inputs.
+
+    Default values are applied and temporary locations of uploaded
+    files are replaced by checksums of their content (see
+    :func:`_canonical_file`), so that equivalent inputs have the same
+    representation.
+
+    :param dict proc_input: process inputs
+    :param input_schema: process' input schema (compiled or not)
+    :rtype: dict
+
+    """
+    input_schema = compile_schema(input_schema)
+    canonical = copy.deepcopy(proc_input)
+
+    for field, fields in input_schema.iterate_values(canonical, input_schema.default_fields):
+        if field.name not in fields:
+            dict_dot(canonical, field.path, copy.deepcopy(field.schema['default']))
+
+    for field, fields in input_schema.iterate_values(canonical, input_schema.file_fields):
+        if field.name not in fields:
+            continue
+
+        if field.type.startswith('basic:file:'):
+            fields[field.name] = _canonical_file(fields[field.name])
+        elif field.type.startswith('list:basic:file:'):
+            fields[field.name] = [_canonical_file(value) for value in fields[field.name]]
+
+    return canonical
+
+
+def get_data_checksum(proc_input, proc_slug, proc_version, input_schema=None):
+    """Compute checksum of processor inputs, name and version.
+
+    If ``input_schema`` is given, the checksum is computed on the
+    canonical representation of inputs (see
+    :func:`canonicalize_input`).
 
+    """
+    if input_schema is not None:
+        proc_input = canonicalize_input(proc_input, input_schema)
 
-def get_data_checksum(proc_input, proc_slug, proc_version):
-    """Compute checksum of processor inputs, name and version."""
     checksum = hashlib.sha256()
     checksum.update(json.dumps(proc_input, sort_keys=True).encode('utf-8'))
     checksum.update(proc_slug.encode('utf-8'))
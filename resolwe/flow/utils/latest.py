@@ -0,0 +1,51 @@
+""".. Ignore pydocstyle D400.
+
+===============
+Latest Versions
+===============
+
+Processes and descriptor schemas are referenced by slug and the latest
+version of the referenced object is used. As these objects only change
+when they are registered, latest versions are kept in Django's cache.
+
+Cached objects are invalidated when an object with the same slug is
+saved or deleted (see :mod:`resolwe.flow.signals`) and when the
+``register`` management command updates an existing object. Processes
+that do not share the cache backend (e.g. with the default local memory
+backend) see the changes after :data:`CACHE_TIMEOUT` at the latest.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from django.core.cache import cache
+
+#: number of seconds for which latest versions are cached
+CACHE_TIMEOUT = 300
+
+
+def _get_cache_key(model, slug):
+    """Return cache key of the latest ``model`` object with ``slug``."""
+    return 'resolwe.flow.latest:{}:{}'.format(model._meta.label_lower, slug)  # pylint: disable=protected-access
+
+
+def get_latest_version(model, slug):
+    """Return the latest version of ``model`` object with ``slug``.
+
+    :param model: model with ``slug`` and ``version`` fields, e.g.
+        :class:`~resolwe.flow.models.Process`
+    :param str slug: slug of the object
+    :raises model.DoesNotExist: if there is no object with ``slug``
+
+    """
+    key = _get_cache_key(model, slug)
+    obj = cache.get(key)
+    if obj is None:
+        obj = model.objects.filter(slug=slug).latest()
+        cache.set(key, obj, CACHE_TIMEOUT)
+
+    return obj
+
+
+def invalidate_latest_version(model, slug):
+    """Remove the cached latest version of ``model`` object with ``slug``."""
+    cache.delete(_get_cache_key(model, slug))
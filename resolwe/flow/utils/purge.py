@@ -13,7 +13,8 @@ import shutil
 from django.conf import settings
 
 from resolwe.flow.models import Data
-from resolwe.flow.utils import iterate_fields
+from resolwe.flow.models.storage import EXTERNAL_STORAGE_DIR
+from resolwe.flow.utils.schema import compile_schema, get_compiled_schema
 
 
 def get_purge_files(root, output, output_schema, descriptor, descriptor_schema):
@@ -52,17 +53,20 @@ def get_purge_files(root, output, output_schema, descriptor, descriptor_schema):
     remove_file('jsonout.txt', unreferenced_files)
     remove_file('stderr.txt', unreferenced_files)
     remove_file('stdout.txt', unreferenced_files)
+    remove_file('stdout.txt.gz', unreferenced_files)
+    remove_tree(EXTERNAL_STORAGE_DIR, unreferenced_files)
 
     meta_fields = [
-        [output, output_schema],
-        [descriptor, descriptor_schema]
+        [output, compile_schema(output_schema)],
+        [descriptor, compile_schema(descriptor_schema)]
     ]
 
     for meta_field, meta_field_schema in meta_fields:
-        for field_schema, fields in iterate_fields(meta_field, meta_field_schema):
-            if 'type' in field_schema:
-                field_type = field_schema['type']
-                field_name = field_schema['name']
+        schema_fields = meta_field_schema.file_fields + meta_field_schema.dir_fields
+        for schema_field, fields in meta_field_schema.iterate_values(meta_field, schema_fields):
+            if schema_field.name in fields:
+                field_type = schema_field.type
+                field_name = schema_field.name
 
                 # Remove basic:file: entries
                 if field_type.startswith('basic:file:'):
@@ -105,19 +109,25 @@ def data_purge(data_ids=None, delete=False, verbosity=0):
     data_path = settings.FLOW_EXECUTOR['DATA_DIR']
     unreferenced_files = set()
 
-    data_qs = Data.objects.filter(status__in=[Data.STATUS_DONE, Data.STATUS_ERROR])
+    data_qs = Data.objects.filter(
+        status__in=[Data.STATUS_DONE, Data.STATUS_ERROR]
+    ).select_related('process', 'descriptor_schema').only(
+        # Name is accessed when Data objects are initialized.
+        'id', 'name', 'output', 'descriptor', 'process__version', 'process__modified', 'process__output_schema',
+        'descriptor_schema__version', 'descriptor_schema__modified', 'descriptor_schema__schema',
+    )
     if data_ids is not None:
         data_qs = data_qs.filter(pk__in=data_ids)
 
-    for data in data_qs:
+    for data in data_qs.iterator():
         root = os.path.join(data_path, str(data.id))
 
         unreferenced_files.update(get_purge_files(
             root,
             data.output,
-            data.process.output_schema,
+            get_compiled_schema(data.process, 'output_schema'),
             data.descriptor,
-            getattr(data.descriptor_schema, 'schema', [])
+            get_compiled_schema(data.descriptor_schema, 'schema') if data.descriptor_schema else [],
         ))
 
     # Remove any folders, which do not belong to any data objects.
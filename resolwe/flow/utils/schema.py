@@ -0,0 +1,197 @@
+""".. Ignore pydocstyle D400.
+
+================
+Compiled Schemas
+================
+
+Field schemas of processes and descriptor schemas are nested lists of
+field definitions, which have to be walked every time a data object is
+saved, validated, purged, etc. A :class:`CompiledSchema` flattens such
+schema once and indexes its fields by type, so that only the relevant
+fields have to be visited.
+
+Compiled schemas of saved objects are cached per object's primary key
+and version by :func:`get_compiled_schema`.
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+import copy
+import threading
+
+#: maximal number of compiled schemas kept in the cache
+CACHE_SIZE = 1024
+
+_cache = collections.OrderedDict()  # pylint: disable=invalid-name
+_cache_lock = threading.Lock()  # pylint: disable=invalid-name
+
+
+class SchemaField(collections.namedtuple('SchemaField', ['name', 'type', 'path', 'groups', 'schema'])):
+    """Leaf field of a compiled schema.
+
+    :param str name: name of the field
+    :param str type: type of the field (empty string if not given)
+    :param str path: dot separated path to the field
+    :param tuple groups: names of groups containing the field
+    :param dict schema: field definition
+
+    """
+
+    __slots__ = ()
+
+
+class CompiledSchema(object):
+    """Flattened representation of a field schema.
+
+    Fields are available in the order in which they are defined in
+    :attr:`fields` and grouped by type in :attr:`file_fields`,
+    :attr:`dir_fields`, :attr:`json_fields` and :attr:`data_fields`
+    (each including the ``list:`` variant of the type).
+    :attr:`default_fields` contains fields with default values.
+
+    The compiled schema must not be modified.
+
+    """
+
+    def __init__(self, schema):
+        """Compile the schema."""
+        self.schema = schema
+        self._names = {}
+
+        fields = []
+        self._compile(schema, (), fields, self._names)
+        self.fields = tuple(fields)
+
+        self.default_fields = tuple(field for field in self.fields if 'default' in field.schema)
+        self.file_fields = self._fields_of_type('basic:file:')
+        self.dir_fields = self._fields_of_type('basic:dir:')
+        self.json_fields = self._fields_of_type('basic:json:')
+        self.data_fields = self._fields_of_type('data:')
+
+    def _compile(self, schema, groups, fields, names):
+        """Collect leaf fields of ``schema`` and map names to definitions."""
+        for field_schema in schema:
+            name = field_schema['name']
+            if 'group' in field_schema:
+                group_names = {}
+                names[name] = (field_schema, group_names)
+                self._compile(field_schema['group'], groups + (name,), fields, group_names)
+            else:
+                names[name] = (field_schema, None)
+                fields.append(SchemaField(
+                    name=name,
+                    type=field_schema.get('type', ''),
+                    path='.'.join(groups + (name,)),
+                    groups=groups,
+                    schema=field_schema,
+                ))
+
+    def _fields_of_type(self, type_):
+        """Return fields of ``type_`` or ``list:<type_>`` type."""
+        list_type = 'list:{}'.format(type_)
+        return tuple(
+            field for field in self.fields
+            if field.type.startswith(type_) or field.type.startswith(list_type)
+        )
+
+    def iterate_values(self, values, fields=None):
+        """Iterate over containers of schema fields in ``values``.
+
+        For each field in ``fields`` (all fields by default) yield the
+        field and the dictionary that holds (or would hold) its value.
+        Fields are visited even if their values are not given, so the
+        caller has to check if the field's name is in the dictionary.
+
+        :param dict values: field values
+        :param tuple fields: fields to visit
+        :return: (field, dictionary with the field's value)
+        :rtype: tuple
+
+        """
+        if fields is None:
+            fields = self.fields
+
+        for field in fields:
+            container = values
+            for group in field.groups:
+                container = container[group] if group in container else {}
+            yield field, container
+
+    def iterate_fields(self, values):
+        """Iterate over all field values.
+
+        This is equivalent to :func:`~resolwe.flow.utils.iterate_fields`,
+        but uses the compiled schema.
+
+        :param dict values: field values
+        :return: (field schema, dictionary with the field's value)
+        :rtype: tuple
+        :raises KeyError: if a value is not defined in the schema
+
+        """
+        return self._iterate_fields(values, self._names)
+
+    def _iterate_fields(self, values, names):
+        """Iterate over field values defined in ``names``."""
+        for field_id, properties in values.items():
+            if field_id not in names:
+                raise KeyError("Field definition ({}) missing in schema".format(field_id))
+
+            field_schema, group_names = names[field_id]
+            if group_names is not None:
+                for rvals in self._iterate_fields(properties, group_names):
+                    yield rvals
+            else:
+                yield field_schema, values
+
+
+def compile_schema(schema):
+    """Return a compiled ``schema``.
+
+    ``schema`` is returned unchanged if it is already compiled.
+
+    """
+    if isinstance(schema, CompiledSchema):
+        return schema
+
+    return CompiledSchema(schema or [])
+
+
+def get_compiled_schema(obj, schema_name):
+    """Return compiled schema stored in ``obj``'s ``schema_name`` field.
+
+    Compiled schemas of saved objects are cached per object's type,
+    primary key, version and modification time, so changes of the
+    schema are only noticed once the object is saved.
+
+    :param obj: object with the schema, e.g.
+        :class:`~resolwe.flow.models.Process`
+    :param str schema_name: name of the schema field, e.g.
+        ``input_schema``
+    :rtype: CompiledSchema
+
+    """
+    schema = getattr(obj, schema_name) or []
+    if obj.pk is None:
+        return CompiledSchema(schema)
+
+    key = (type(obj).__name__, obj.pk, str(obj.version), obj.modified, schema_name)
+    with _cache_lock:
+        compiled = _cache.pop(key, None)
+        if compiled is not None:
+            # Re-insert the schema to mark it as recently used.
+            _cache[key] = compiled
+
+    if compiled is not None:
+        return compiled
+
+    # Copy the schema, so that in-place changes of the object's schema
+    # do not change the cached one.
+    compiled = CompiledSchema(copy.deepcopy(schema))
+    with _cache_lock:
+        _cache[key] = compiled
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return compiled
@@ -0,0 +1,190 @@
+""".. Ignore pydocstyle D400.
+
+========================
+Process' Standard Output
+========================
+
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+import gzip
+import io
+import os
+import zlib
+
+import six
+
+from django.conf import settings
+
+#: name of the file with process' standard output
+STDOUT_FILENAME = 'stdout.txt'
+
+#: name of the file with compressed process' standard output
+STDOUT_COMPRESSED_FILENAME = 'stdout.txt.gz'
+
+#: default number of bytes kept from the end of a truncated output
+DEFAULT_TAIL_SIZE = 1024 * 1024
+
+#: maximal number of bytes returned from the end of the output
+MAX_TAIL_SIZE = 16 * 1024 * 1024
+
+#: size of the write buffer
+BUFFER_SIZE = 64 * 1024
+
+
+class StdoutWriter(object):
+    """Buffered writer of process' standard output.
+
+    Output is written to ``stdout.txt`` in ``directory`` or, if
+    ``compress`` is set, gzip compressed to ``stdout.txt.gz``.
+
+    If ``max_size`` is given, output is written until it would exceed
+    ``max_size - tail_size`` bytes. After that, only the last
+    ``tail_size`` bytes are kept in memory and they are appended to the
+    file when the writer is closed, together with a line saying how
+    much output was omitted.
+
+    """
+
+    def __init__(self, directory, compress=False, max_size=None, tail_size=DEFAULT_TAIL_SIZE):
+        """Open the output file."""
+        self.compress = compress
+        self.path = os.path.join(directory, STDOUT_COMPRESSED_FILENAME if compress else STDOUT_FILENAME)
+
+        self._file = io.open(self.path, 'wb', buffering=BUFFER_SIZE)
+        self._stream = gzip.GzipFile(fileobj=self._file, mode='wb') if compress else self._file
+        self._closed = False
+
+        if max_size is None:
+            self._head_size = None
+            self._tail_size = 0
+        else:
+            self._tail_size = min(tail_size, max_size)
+            self._head_size = max_size - self._tail_size
+
+        self._written = 0
+        self._omitted = 0
+        self._tail = collections.deque()
+        self._tail_bytes = 0
+
+    def write(self, line):
+        """Write a line of output."""
+        if isinstance(line, six.text_type):
+            line = line.encode('utf-8')
+
+        if self._head_size is None or self._written + len(line) <= self._head_size:
+            self._stream.write(line)
+            self._written += len(line)
+            return
+
+        # Once the head is full, no more lines are written to it.
+        self._head_size = self._written
+
+        self._tail.append(line)
+        self._tail_bytes += len(line)
+        while self._tail_bytes > self._tail_size:
+            dropped = self._tail.popleft()
+            self._tail_bytes -= len(dropped)
+            self._omitted += len(dropped)
+
+    def close(self):
+        """Write the kept tail and close the file."""
+        if self._closed:
+            return
+
+        if self._omitted:
+            self._stream.write('\n[... {} bytes of output omitted ...]\n'.format(self._omitted).encode('utf-8'))
+
+        for line in self._tail:
+            self._stream.write(line)
+        self._tail.clear()
+
+        if self.compress:
+            self._stream.close()
+        self._file.close()
+        self._closed = True
+
+
+def get_stdout_path(data_id):
+    """Return the path to the standard output file of a data object.
+
+    ``None`` is returned if the file does not exist.
+
+    """
+    data_dir = os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], str(data_id))
+    for filename in (STDOUT_FILENAME, STDOUT_COMPRESSED_FILENAME):
+        path = os.path.join(data_dir, filename)
+        if os.path.isfile(path):
+            return path
+
+    return None
+
+
+def _read_compressed_tail(path, size):
+    """Return the last ``size`` bytes of gzip compressed file at ``path``.
+
+    The file is decompressed as a stream and only chunks covering the
+    last ``size`` bytes are kept. Output of running or crashed processes
+    has no end-of-stream marker, so everything that can be decompressed
+    is used.
+
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = collections.deque()
+    kept = 0
+
+    with io.open(path, 'rb') as handle:
+        try:
+            while True:
+                data = handle.read(BUFFER_SIZE)
+                if not data:
+                    break
+
+                while data:
+                    # Limit decompressed chunks, as output compresses well.
+                    chunk = decompressor.decompress(data, BUFFER_SIZE)
+                    data = decompressor.unconsumed_tail
+
+                    chunks.append(chunk)
+                    kept += len(chunk)
+                    while kept - len(chunks[0]) >= size:
+                        kept -= len(chunks.popleft())
+        except zlib.error:
+            # Corrupted stream, return what was decompressed so far.
+            pass
+
+    return b''.join(chunks)[-size:]
+
+
+def read_stdout_tail(data_id, size=DEFAULT_TAIL_SIZE):
+    """Return the last ``size`` bytes of data object's standard output.
+
+    Uncompressed output is read from its end, so only the requested
+    part of the file is read. Compressed output has to be decompressed
+    as a stream, but only the last ``size`` bytes are kept in memory.
+
+    :param int data_id: id of the data object
+    :param int size: maximal number of bytes to return, at most
+        :data:`MAX_TAIL_SIZE`
+    :return: decoded output or ``None`` if there is no output
+    :rtype: str
+
+    """
+    path = get_stdout_path(data_id)
+    if path is None:
+        return None
+
+    size = min(size, MAX_TAIL_SIZE)
+    if size <= 0:
+        return ''
+
+    if path.endswith('.gz'):
+        tail = _read_compressed_tail(path, size)
+    else:
+        with io.open(path, 'rb') as handle:
+            handle.seek(0, os.SEEK_END)
+            handle.seek(max(handle.tell() - size, 0))
+            tail = handle.read()
+
+    return tail.decode('utf-8', 'replace')
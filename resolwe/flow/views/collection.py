@@ -37,7 +37,7 @@ class CollectionViewSet(ResolweCreateModelMixin,
     serializer_class = CollectionSerializer
     permission_classes = (get_permissions_class(),)
     filter_class = CollectionFilter
-    ordering_fields = ('id', 'created', 'modified', 'name')
+    ordering_fields = ('id', 'created', 'modified', 'name', 'latest_date', 'data_count')
     ordering = ('id',)
 
     def set_content_permissions(self, user, obj, payload):
@@ -1,27 +1,37 @@
 """Data viewset."""
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from django.db import transaction
-from django.db.models import Count
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, Min
+from django.db.models.signals import post_save
 
 from guardian.shortcuts import assign_perm
+from guardian.utils import get_anonymous_user
 from rest_framework import exceptions, mixins, status, viewsets
-from rest_framework.decorators import list_route
+from rest_framework.decorators import detail_route, list_route
 from rest_framework.response import Response
 
 from resolwe.flow.filters import DataFilter
 from resolwe.flow.managers import manager
-from resolwe.flow.models import Collection, Data, Entity, Process
+from resolwe.flow.models import Collection, Data, DescriptorSchema, Entity, Process
 from resolwe.flow.serializers import DataSerializer
-from resolwe.flow.utils import dict_dot, get_data_checksum, iterate_schema
+from resolwe.flow.utils import get_data_checksum
+from resolwe.flow.utils.latest import get_latest_version
+from resolwe.flow.utils.schema import get_compiled_schema
+from resolwe.flow.utils.stdout import DEFAULT_TAIL_SIZE, MAX_TAIL_SIZE, read_stdout_tail
 from resolwe.permissions.loader import get_permissions_class
 from resolwe.permissions.mixins import ResolwePermissionsMixin
 from resolwe.permissions.shortcuts import get_objects_for_user
+from resolwe.permissions.utils import bulk_assign_contributor_permissions
 
-from .mixins import ResolweCheckSlugMixin, ResolweCreateModelMixin, ResolweUpdateModelMixin
+from .mixins import (
+    ResolweCheckSlugMixin, ResolweCreateModelMixin, ResolweJSONProjectionMixin, ResolweUpdateModelMixin,
+    get_descriptor_schames,
+)
 
 
-class DataViewSet(ResolweCreateModelMixin,
+class DataViewSet(ResolweJSONProjectionMixin,
+                  ResolweCreateModelMixin,
                   mixins.RetrieveModelMixin,
                   ResolweUpdateModelMixin,
                   mixins.DestroyModelMixin,
@@ -37,6 +47,7 @@ class DataViewSet(ResolweCreateModelMixin,
     filter_class = DataFilter
     ordering_fields = ('id', 'created', 'modified', 'started', 'finished', 'name')
     ordering = ('id',)
+    projectable_json_fields = ('input', 'output', 'descriptor')
 
     def create(self, request, *args, **kwargs):
         """Create a resource."""
@@ -63,35 +74,46 @@ class DataViewSet(ResolweCreateModelMixin,
 
         # translate processe's slug to id
         process_slug = request.data.get('process', None)
-        process_query = Process.objects.filter(slug=process_slug)
-        process_query = get_objects_for_user(request.user, 'view_process', process_query)
         try:
-            process = process_query.latest()
+            process = get_latest_version(Process, process_slug)
         except Process.DoesNotExist:
-            return Response({'process': ['Invalid process slug "{}" - object does not exist.'.format(process_slug)]},
-                            status=status.HTTP_400_BAD_REQUEST)
+            process = None
+
+        if process is not None:
+            # Permissions are checked in the same way as in the lookup
+            # below, so that public permissions are taken into account.
+            process_query = Process.objects.filter(pk=process.pk)
+            if not get_objects_for_user(request.user, 'view_process', process_query).exists():
+                process = None
+
+        if process is None:
+            # Use the latest version the user has permissions for.
+            process_query = Process.objects.filter(slug=process_slug)
+            process_query = get_objects_for_user(request.user, 'view_process', process_query)
+            try:
+                process = process_query.latest()
+            except Process.DoesNotExist:
+                return Response(
+                    {'process': ['Invalid process slug "{}" - object does not exist.'.format(process_slug)]},
+                    status=status.HTTP_400_BAD_REQUEST)
         request.data['process'] = process.pk
 
         # perform "get_or_create" if requested - return existing object
         # if found
         if kwargs.pop('get_or_create', False):
-            process_input = request.data.get('input', {})
-
-            # use default values if they are not given
-            for field_schema, fields, path in iterate_schema(process_input, process.input_schema):
-                if 'default' in field_schema and field_schema['name'] not in fields:
-                    dict_dot(process_input, path, field_schema['default'])
-
-            checksum = get_data_checksum(process_input, process.slug, process.version)
-            data_qs = Data.objects.filter(
-                checksum=checksum,
-                process__persistence__in=[Process.PERSISTENCE_CACHED, Process.PERSISTENCE_TEMP],
-            )
-            data_qs = get_objects_for_user(request.user, 'view_data', data_qs)
-            if data_qs.exists():
+            if process.persistence in [Process.PERSISTENCE_CACHED, Process.PERSISTENCE_TEMP]:
+                checksum = get_data_checksum(
+                    request.data.get('input', {}),
+                    process.slug,
+                    process.version,
+                    get_compiled_schema(process, 'input_schema'),
+                )
+                data_qs = Data.objects.filter(checksum=checksum, process=process)
+                data_qs = get_objects_for_user(request.user, 'view_data', data_qs)
                 data = data_qs.order_by('created').last()
-                serializer = self.get_serializer(data)
-                return Response(serializer.data)
+                if data is not None:
+                    serializer = self.get_serializer(data)
+                    return Response(serializer.data)
 
         # create the objects
         resp = super(DataViewSet, self).create(request, *args, **kwargs)
@@ -107,6 +129,182 @@ class DataViewSet(ResolweCreateModelMixin,
         kwargs['get_or_create'] = True
         return self.create(request, *args, **kwargs)
 
+    @list_route(methods=[u'post'])
+    def bulk_create(self, request, *args, **kwargs):
+        """Create many ``Data`` objects at once.
+
+        The request body is a list of objects in the same format as
+        accepted by ``create`` and each of them is validated by the data
+        serializer. Processes, descriptor schemas and collections are
+        resolved once per distinct value, data objects, their
+        permissions and collection memberships are inserted in bulk and
+        the manager is run once all objects are created.
+
+        """
+        if (not isinstance(request.data, list) or not request.data or
+                not all(isinstance(spec, dict) for spec in request.data)):
+            return Response({'error': 'A non-empty list of data objects is required.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if request.user.is_anonymous():
+            contributor = get_anonymous_user()
+        else:
+            contributor = request.user
+
+        processes = {}
+        process_slugs = {spec.get('process', None) for spec in request.data}
+        process_qs = get_objects_for_user(
+            request.user, 'view_process', Process.objects.filter(slug__in=process_slugs)
+        )
+        for process in process_qs.order_by('-version'):
+            processes.setdefault(process.slug, process)
+        missing = process_slugs - set(processes)
+        if missing:
+            return Response(
+                {'process': ['Invalid process slug "{}" - object does not exist.'.format(slug) for slug in missing]},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        descriptor_schemas = {}
+        for spec in request.data:
+            ds_query = spec.get('descriptor_schema', None)
+            if ds_query and ds_query not in descriptor_schemas:
+                try:
+                    descriptor_schemas[ds_query] = get_descriptor_schames(ds_query, request.user).latest()
+                except DescriptorSchema.DoesNotExist:
+                    return Response(
+                        {'descriptor_schema': [
+                            'Invalid descriptor_schema slug "{}" - object does not exist.'.format(ds_query)]},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            collection_ids = {int(c) for spec in request.data for c in spec.get('collections', [])}
+        except (TypeError, ValueError):
+            return Response({'collections': ['Collection ids must be integers.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        collections = Collection.objects.in_bulk(list(collection_ids))
+        missing = collection_ids - set(collections)
+        if missing:
+            return Response(
+                {'collections': ['Invalid pk "{}" - object does not exist.'.format(pk) for pk in sorted(missing)]},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        addable = set(get_objects_for_user(
+            request.user, 'add_collection', Collection.objects.filter(pk__in=collection_ids)
+        ).values_list('pk', flat=True))
+        if addable != collection_ids:
+            not_addable = sorted(collection_ids - addable)
+            visible = set(get_objects_for_user(
+                request.user, 'view_collection', Collection.objects.filter(pk__in=not_addable)
+            ).values_list('pk', flat=True))
+            for collection_id in not_addable:
+                if collection_id in visible:
+                    raise exceptions.PermissionDenied(
+                        "You don't have `ADD` permission on collection (id: {}).".format(collection_id)
+                    )
+                else:
+                    raise exceptions.NotFound(
+                        "Collection not found (id: {}).".format(collection_id)
+                    )
+
+        payload = []
+        for spec in request.data:
+            item = dict(spec, process=processes[spec['process']].pk, contributor=contributor.pk)
+            item.pop('collections', None)
+            if spec.get('descriptor_schema', None):
+                item['descriptor_schema'] = descriptor_schemas[spec['descriptor_schema']].pk
+            payload.append(item)
+
+        serializer = self.get_serializer(data=payload, many=True)
+        serializer.is_valid(raise_exception=True)
+        instances = [Data(**validated_data) for validated_data in serializer.validated_data]
+
+        try:
+            with transaction.atomic():
+                Data.bulk_create_data(instances)
+                bulk_assign_contributor_permissions(instances)
+
+                members = {}
+                for spec, instance in zip(request.data, instances):
+                    for collection_id in spec.get('collections', []):
+                        members.setdefault(int(collection_id), []).append(instance)
+
+                # Entities are added to collections only when they are
+                # created - when they only contain 1 data object.
+                entities = {
+                    entity.data_id: entity for entity in Entity.objects.filter(
+                        pk__in=Entity.objects.filter(data__in=instances).values('pk')
+                    ).annotate(num_data=Count('data'), data_id=Min('data')).filter(num_data=1)
+                }
+                for collection_id, collection_data in members.items():
+                    collection = collections[collection_id]
+                    collection.data.add(*collection_data)
+                    collection.entity_set.add(*[
+                        entities[data.pk] for data in collection_data if data.pk in entities
+                    ])
+
+                # Sending signals inside the transaction runs the manager
+                # only once, after the transaction is committed.
+                using = router.db_for_write(Data)
+                for instance in instances:
+                    post_save.send(sender=Data, instance=instance, created=True, update_fields=None, raw=False,
+                                   using=using)
+        except IntegrityError as ex:
+            return Response({u'error': str(ex)}, status=status.HTTP_409_CONFLICT)
+
+        serializer = self.get_serializer(instances, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @detail_route(methods=[u'get'])
+    def stdout(self, request, *args, **kwargs):
+        """Return the tail of ``Data`` object's standard output.
+
+        Number of returned bytes can be set with the ``size`` query
+        parameter, up to ``MAX_TAIL_SIZE``. Standard output is a file of
+        the data object, so ``download`` permission is required.
+
+        """
+        instance = self.get_object()
+
+        # Checked on a queryset, so that public permissions are taken
+        # into account.
+        if not get_objects_for_user(request.user, 'download_data', Data.objects.filter(pk=instance.pk)).exists():
+            raise exceptions.PermissionDenied()
+
+        try:
+            size = int(request.query_params.get('size', DEFAULT_TAIL_SIZE))
+        except ValueError:
+            return Response({'size': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        size = min(size, MAX_TAIL_SIZE)
+
+        stdout = read_stdout_tail(instance.pk, size=size)
+        if stdout is None:
+            raise exceptions.NotFound("Standard output not found (id: {}).".format(instance.pk))
+
+        return Response({'stdout': stdout})
+
+    def _lineage_response(self, queryset):
+        """Return paginated response with data objects in ``queryset``."""
+        queryset = self.filter_queryset(self.get_queryset()).filter(pk__in=queryset.values('pk'))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @detail_route(methods=[u'get'])
+    def ancestors(self, request, *args, **kwargs):
+        """Return all data objects ``Data`` object (transitively) depends on."""
+        return self._lineage_response(self.get_object().ancestors())
+
+    @detail_route(methods=[u'get'])
+    def descendants(self, request, *args, **kwargs):
+        """Return all data objects that (transitively) depend on ``Data`` object."""
+        return self._lineage_response(self.get_object().descendants())
+
     def perform_create(self, serializer):
         """Create a resource."""
         with transaction.atomic():
@@ -3,7 +3,6 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 from distutils.util import strtobool  # pylint: disable=import-error,no-name-in-module
 
-from django.db.models import Max
 from django.db.models.query import Prefetch
 
 from rest_framework import exceptions, status
@@ -28,8 +27,6 @@ class EntityViewSet(CollectionViewSet):
         Prefetch('data', queryset=Data.objects.all().order_by('id')),
         'descriptor_schema',
         'contributor'
-    ).annotate(
-        latest_date=Max('data__modified')
     ).order_by('-latest_date')
 
     def _check_collection_permissions(self, collection_id, user):
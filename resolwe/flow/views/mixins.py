@@ -11,6 +11,7 @@ from rest_framework.response import Response
 from resolwe.flow.models import DescriptorSchema
 from resolwe.permissions.shortcuts import get_objects_for_user
 from resolwe.permissions.utils import assign_contributor_permissions
+from resolwe.rest.projection import project_json_fields
 
 
 def get_descriptor_schames(query, user):
@@ -126,3 +127,22 @@ class ResolweCheckSlugMixin(object):
         queryset = self.get_queryset()
         slug_name = request.query_params['name']
         return Response(queryset.filter(slug__iexact=slug_name).exists())
+
+
+class ResolweJSONProjectionMixin(object):
+    """Fetch only the parts of JSON fields requested in the projection.
+
+    JSON fields listed in ``projectable_json_fields`` are projected in
+    the database on ``GET`` requests (see
+    :func:`~resolwe.rest.projection.project_json_fields`).
+
+    """
+
+    projectable_json_fields = ()
+
+    def get_queryset(self):
+        """Return queryset with projected JSON fields."""
+        queryset = super(ResolweJSONProjectionMixin, self).get_queryset()
+        if self.request.method == 'GET':
+            queryset = project_json_fields(queryset, self.request, self.projectable_json_fields)
+        return queryset
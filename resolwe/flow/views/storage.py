@@ -1,13 +1,20 @@
 """Storage viewset."""
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from rest_framework import mixins, viewsets
+from django.shortcuts import get_object_or_404
+
+from rest_framework import exceptions, mixins, viewsets
+from rest_framework.decorators import detail_route
+from rest_framework.response import Response
 
 from resolwe.flow.models import Storage
 from resolwe.flow.serializers import StorageSerializer
 
+from .mixins import ResolweJSONProjectionMixin
+
 
-class StorageViewSet(mixins.RetrieveModelMixin,
+class StorageViewSet(ResolweJSONProjectionMixin,
+                     mixins.RetrieveModelMixin,
                      mixins.ListModelMixin,
                      viewsets.GenericViewSet):
     """API view for :class:`Storage` objects."""
@@ -15,3 +22,43 @@ class StorageViewSet(mixins.RetrieveModelMixin,
     queryset = Storage.objects.all().prefetch_related('contributor')
     serializer_class = StorageSerializer
     filter_fields = ('contributor', 'name', 'created', 'modified', 'slug')
+    projectable_json_fields = ('json',)
+
+    @detail_route(methods=[u'get'])
+    def json(self, request, *args, **kwargs):
+        """Return a part of storage's JSON.
+
+        The part is selected with the following query parameters:
+
+        * ``path``: dot separated keys (or indices) leading to the value
+        * ``start`` and ``stop``: slice of the (array) value
+        * ``columns``: comma separated keys (or indices) of items to
+          select from each item (row) of the sliced array
+
+        """
+        # JSON is not fetched, so that only the requested part is read.
+        queryset = self.filter_queryset(self.get_queryset()).defer('json')
+        instance = get_object_or_404(queryset, pk=kwargs['pk'])
+        self.check_object_permissions(request, instance)
+
+        path = request.query_params.get('path', None)
+        columns = request.query_params.get('columns', None)
+        try:
+            start = request.query_params.get('start', None)
+            start = int(start) if start is not None else None
+            stop = request.query_params.get('stop', None)
+            stop = int(stop) if stop is not None else None
+        except ValueError:
+            raise exceptions.ParseError("Slice must be given with integers.")
+
+        try:
+            value = instance.read_json(
+                path=path.split('.') if path else None,
+                start=start,
+                stop=stop,
+                columns=columns.split(',') if columns else None,
+            )
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise exceptions.NotFound("Path not found in storage (id: {}).".format(instance.pk))
+
+        return Response(value)
@@ -6,13 +6,17 @@ Permissions utils
 
 .. autofunction:: copy_permissions
 
+.. autofunction:: bulk_copy_permissions
+
+.. autofunction:: bulk_assign_contributor_permissions
+
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import copy
 
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import AnonymousUser, Group
+from django.contrib.auth.models import AnonymousUser, Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
 
@@ -35,6 +39,39 @@ def copy_permissions(src_obj, dest_obj):
         assign_perm(perm.permission.codename, perm.group, dest_obj)
 
 
+def bulk_copy_permissions(src_obj, dest_objs):
+    """Copy permissions from ``src_obj`` to all objects in ``dest_objs``.
+
+    Objects in ``dest_objs`` must not have any permissions yet.
+    Permissions are inserted in bulk, so no signals are sent for the
+    created permission objects.
+
+    """
+    if not dest_objs:
+        return
+
+    src_obj_ctype = ContentType.objects.get_for_model(src_obj)
+    for dest_obj in dest_objs:
+        if ContentType.objects.get_for_model(dest_obj) != src_obj_ctype:
+            raise AssertionError('Content types of source and destination objects are not equal.')
+
+    for perm_model, entity_field in [(UserObjectPermission, 'user_id'), (GroupObjectPermission, 'group_id')]:
+        perms = perm_model.objects.filter(
+            object_pk=src_obj.pk, content_type=src_obj_ctype
+        ).values_list('permission_id', entity_field)
+
+        perm_model.objects.bulk_create([
+            perm_model(
+                permission_id=permission_id,
+                content_type=src_obj_ctype,
+                object_pk=str(dest_obj.pk),
+                **{entity_field: entity_id}
+            )
+            for permission_id, entity_id in perms
+            for dest_obj in dest_objs
+        ])
+
+
 def fetch_user(query):
     """Get user by ``pk`` or ``username``. Raise error if it doesn't exist."""
     user_filter = {'pk': query} if query.isdigit() else {'username': query}
@@ -171,3 +208,29 @@ def assign_contributor_permissions(obj, contributor=None):
     """Assign all permissions to object's contributor."""
     for permission in list(zip(*obj._meta.permissions))[0]:  # pylint: disable=protected-access
         assign_perm(permission, contributor if contributor else obj.contributor, obj)
+
+
+def bulk_assign_contributor_permissions(objs, contributor=None):
+    """Assign all permissions to contributors of all objects in ``objs``.
+
+    Objects must be of the same model. Permissions are inserted in
+    bulk, so no signals are sent for the created permission objects.
+
+    """
+    if not objs:
+        return
+
+    ctype = ContentType.objects.get_for_model(objs[0])
+    codenames = list(zip(*objs[0]._meta.permissions))[0]  # pylint: disable=protected-access
+    permissions = list(Permission.objects.filter(content_type=ctype, codename__in=codenames))
+
+    UserObjectPermission.objects.bulk_create([
+        UserObjectPermission(
+            permission=permission,
+            content_type=ctype,
+            object_pk=str(obj.pk),
+            user=contributor if contributor else obj.contributor,
+        )
+        for obj in objs
+        for permission in permissions
+    ])
@@ -7,7 +7,21 @@ from .projection import apply_subfield_projection
 
 
 class ProjectableJSONField(JSONField):
-    """JSON field which supports projection."""
+    """JSON field which supports projection.
+
+    If the serialized object has the ``projected_<field name>``
+    attribute (see :func:`~resolwe.rest.projection.project_json_fields`),
+    the value is built from it instead of being read from the source.
+
+    """
+
+    def get_attribute(self, instance):
+        """Return the projected value if it was fetched."""
+        projected = getattr(instance, 'projected_{}'.format(self.field_name), None)
+        if projected is None:
+            return super(ProjectableJSONField, self).get_attribute(instance)
+
+        return {key: value[0] for key, value in projected.items() if value is not None}
 
     def to_representation(self, value):
         """Project outgoing native value."""
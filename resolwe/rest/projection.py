@@ -3,9 +3,16 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 from collections import Mapping, Sequence
 
+from django.contrib.postgres.fields import JSONField
+from django.db.models.expressions import RawSQL
+
 FIELD_SEPARATOR = ','
 FIELD_DEREFERENCE = '__'
 
+# Maximal number of keys of a JSON field fetched separately (limited by
+# the maximal number of function arguments in Postgres).
+MAX_PROJECTED_KEYS = 50
+
 
 def apply_subfield_projection(field, value, deep=False):
     """Apply projection from request context.
@@ -96,3 +103,87 @@ def apply_projection(projection, value):
             )
 
     return value
+
+
+def get_json_projection(request, field_name):
+    """Return top-level keys of a JSON field requested in the projection.
+
+    :param request: request with the ``fields`` query parameter
+    :param str field_name: name of the JSON field
+    :return: ``None`` if the whole field is needed, an empty set if
+        the field is not needed at all, or a set of requested keys
+    :rtype: set
+
+    """
+    filtered = set(request.query_params.get('fields', '').split(FIELD_SEPARATOR))
+    filtered.discard('')
+    if not filtered:
+        return None
+
+    keys = set()
+    for item in filtered:
+        item = item.split(FIELD_DEREFERENCE)
+        if item[0] != field_name:
+            continue
+
+        if len(item) == 1:
+            # The whole field is requested.
+            return None
+
+        keys.add(item[1])
+
+    return keys
+
+
+def project_json_fields(queryset, request, field_names):
+    """Fetch only the parts of JSON fields requested in the projection.
+
+    JSON fields that are not requested are deferred. If only some
+    top-level keys of a field are requested, the field is deferred and
+    only values of those keys are fetched into the ``projected_<field>``
+    attribute, which is used by
+    :class:`~resolwe.rest.fields.ProjectableJSONField`. Deeper levels
+    of the projection are still applied by the serializer field.
+
+    :param queryset: queryset to change
+    :param request: request with the ``fields`` query parameter
+    :param list field_names: names of JSON fields of the model
+    :return: changed queryset
+
+    """
+    for field_name in field_names:
+        keys = get_json_projection(request, field_name)
+        if keys is None or len(keys) > MAX_PROJECTED_KEYS:
+            continue
+
+        queryset = queryset.defer(field_name)
+        if not keys:
+            continue
+
+        column = '"{}"."{}"'.format(
+            queryset.model._meta.db_table,  # pylint: disable=protected-access
+            queryset.model._meta.get_field(field_name).column,  # pylint: disable=protected-access
+        )
+
+        # Values are wrapped in arrays to distinguish missing keys from
+        # null values.
+        items = []
+        params = []
+        for key in sorted(keys):
+            items.append(
+                '%s::text, CASE WHEN {column} -> %s::text IS NULL THEN NULL '
+                'ELSE jsonb_build_array({column} -> %s::text) END'.format(column=column)
+            )
+            params.extend([key, key, key])
+
+        queryset = queryset.annotate(**{
+            'projected_{}'.format(field_name): RawSQL(
+                'CASE WHEN {column} IS NULL THEN NULL ELSE jsonb_build_object({items}) END'.format(
+                    column=column, items=', '.join(items)
+                ),
+                params,
+                output_field=JSONField(),
+            )
+        })
+
+    return queryset
@@ -5,10 +5,12 @@ import itertools
 
 import six
 
+from rest_framework.request import Request
 from rest_framework.test import APIRequestFactory, force_authenticate
 
 from resolwe.flow.models import Data, Entity, Process
-from resolwe.flow.views import EntityViewSet
+from resolwe.flow.views import DataViewSet, EntityViewSet
+from resolwe.rest.projection import project_json_fields
 from resolwe.test import TestCase
 
 factory = APIRequestFactory()  # pylint: disable=invalid-name
@@ -84,3 +86,28 @@ class ProjectionTest(TestCase):
             six.assertCountEqual(self, item['output'].keys(), ['foo'])
             six.assertCountEqual(self, item['output']['foo'].keys(), ['bar'])
             self.assertEqual(item['output']['foo']['bar'], 42)
+
+    def test_json_projection_pushdown(self):
+        data_viewset = DataViewSet.as_view(actions={'get': 'list'})
+
+        def get_data(fields):
+            request = factory.get('/', {'fields': ','.join(fields)}, format='json')
+            force_authenticate(request, self.admin)
+            return data_viewset(request).data[0]
+
+        # Only requested keys of the output are fetched from the database.
+        queryset = project_json_fields(
+            Data.objects.all(),
+            Request(factory.get('/', {'fields': 'output__foo__bar'})),
+            ('input', 'output', 'descriptor')
+        )
+        data = queryset.get(pk=self.data.pk)
+        six.assertCountEqual(self, data.get_deferred_fields(), ['output'])
+        self.assertEqual(data.projected_output, {'foo': [self.data_output['foo']]})
+
+        item = get_data(['id', 'output__foo__bar', 'output__missing'])
+        six.assertCountEqual(self, item.keys(), ['id', 'output', 'current_user_permissions'])
+        self.assertEqual(item['output'], {'foo': {'bar': 42}})
+
+        item = get_data(['output'])
+        self.assertEqual(item['output'], self.data_output)
@@ -12,7 +12,6 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import gzip
 import hashlib
-import io
 import json
 import os
 import shutil
@@ -31,6 +30,7 @@ from django.utils.text import slugify
 from resolwe.flow.managers import manager
 from resolwe.flow.models import Collection, Data, DescriptorSchema, Process, Storage
 from resolwe.flow.utils import dict_dot, iterate_fields, iterate_schema
+from resolwe.flow.utils.stdout import read_stdout_tail
 from resolwe.test import TransactionTestCase
 
 from .setting_overrides import FLOW_DOCKER_MAPPINGS, FLOW_EXECUTOR_SETTINGS
@@ -343,9 +343,9 @@ class TransactionProcessTestCase(TransactionTestCase):
         self.assertEqual(os.path.splitext(file_name)[1], '.gz', msg='File extension must be .gz')
 
         if isinstance(storage, Storage):
-            json_dict = storage.json
+            json_dict = storage.get_json()
         elif isinstance(storage, int):
-            json_dict = Storage.objects.get(pk=storage).json
+            json_dict = Storage.objects.get(pk=storage).get_json()
         elif isinstance(storage, dict):
             json_dict = storage
         else:
@@ -571,7 +571,7 @@ class TransactionProcessTestCase(TransactionTestCase):
         if not isinstance(storage, Storage):
             storage = Storage.objects.get(pk=storage)
 
-        storage_obj = dict_dot(storage.json, field_path)
+        storage_obj = dict_dot(storage.get_json(), field_path)
 
         file_path = os.path.join(self.files_path, file_name)
         if not os.path.isfile(file_path):
@@ -591,11 +591,10 @@ class TransactionProcessTestCase(TransactionTestCase):
         """Return data's debugging information."""
         msg_header = "Debugging information for data object {}".format(data.pk)
         msg = "\n\n" + len(msg_header) * "=" + "\n" + msg_header + "\n" + len(msg_header) * "=" + "\n"
-        path = os.path.join(settings.FLOW_EXECUTOR['DATA_DIR'], str(data.pk), "stdout.txt")
-        if os.path.isfile(path):
+        stdout = read_stdout_tail(data.pk)
+        if stdout is not None:
             msg += "\nstdout.txt:\n" + 11 * "-" + "\n"
-            with io.open(path, mode='rt') as fn:
-                msg += fn.read()
+            msg += stdout
 
         if data.process_error:
             msg += "\nProcess' errors:\n" + 16 * "-" + "\n"